@@ -0,0 +1,339 @@
+import asyncio
+import contextlib
+import json
+import logging
+import os
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+from be import serve
+from be.model import error
+from be.model import metrics
+from be.model import search
+from be.model import store
+from be.model import user
+from be.model.buyer import Buyer
+from be.model.seller import Seller
+
+# 异步模式：与 Flask 版本相同的 /auth、/buyer、/seller 接口，运行在 asyncio 上，
+# 数据库使用异步引擎，模型代码通过 AsyncSession.run_sync 与同步模式共用。
+# 用法 python -m be.asgi，或 uvicorn be.asgi:app --workers N
+
+database: store.AsyncStoreORM = None
+server: uvicorn.Server = None
+routes = []
+
+
+async def read_json(request: Request) -> dict:
+    try:
+        body = await request.json()
+    except json.JSONDecodeError:
+        return {}
+    return body if isinstance(body, dict) else {}
+
+
+# 与 auth.login_required 相同的鉴权：校验 header 中的 token，请求体中的 user_id 必须与之一致
+async def check_login(request: Request, body: dict):
+    token = request.headers.get("token", "")
+    code, message, token_user_id = await database.run_sync(lambda s: user.verify_token(token, s))
+    if code != 200:
+        return JSONResponse({"message": message}, status_code=code)
+
+    user_id = body.get("user_id")
+    if user_id is not None and user_id != token_user_id:
+        code, message = error.error_authorization_fail()
+        return JSONResponse({"message": message}, status_code=code)
+    return None
+
+
+# 注册 POST 接口：处理函数接收 (request, body)，返回 (响应体, 状态码)
+def post(path: str, login_required: bool = False):
+    def decorator(func):
+        async def endpoint(request: Request):
+            scope = metrics.begin_scope()
+            try:
+                body = await read_json(request)
+                if login_required:
+                    denied = await check_login(request, body)
+                    if denied is not None:
+                        return denied
+                result, code = await func(request, body)
+                return JSONResponse(result, status_code=code)
+            finally:
+                metrics.end_scope(scope)
+                metrics.observe_request(path, scope)
+
+        routes.append(Route(path, endpoint, methods=["POST"]))
+        return func
+
+    return decorator
+
+
+@post("/auth/login")
+async def login(request, body):
+    user_id = body.get("user_id", "")
+    password = body.get("password", "")
+    terminal = body.get("terminal", "")
+    code, message, token = await database.run_sync(
+        lambda s: user.User(s).login(user_id=user_id, password=password, terminal=terminal)
+    )
+    return {"message": message, "token": token}, code
+
+
+@post("/auth/logout")
+async def logout(request, body):
+    user_id = body.get("user_id")
+    token = request.headers.get("token")
+    code, message = await database.run_sync(lambda s: user.User(s).logout(user_id=user_id, token=token))
+    return {"message": message}, code
+
+
+@post("/auth/register")
+async def register(request, body):
+    user_id = body.get("user_id", "")
+    password = body.get("password", "")
+    code, message = await database.run_sync(lambda s: user.User(s).register(user_id=user_id, password=password))
+    return {"message": message}, code
+
+
+@post("/auth/unregister")
+async def unregister(request, body):
+    user_id = body.get("user_id", "")
+    password = body.get("password", "")
+    code, message = await database.run_sync(lambda s: user.User(s).unregister(user_id=user_id, password=password))
+    return {"message": message}, code
+
+
+@post("/auth/password")
+async def change_password(request, body):
+    user_id = body.get("user_id", "")
+    old_password = body.get("oldPassword", "")
+    new_password = body.get("newPassword", "")
+    code, message = await database.run_sync(
+        lambda s: user.User(s).change_password(
+            user_id=user_id, old_password=old_password, new_password=new_password
+        )
+    )
+    return {"message": message}, code
+
+
+@post("/auth/search")
+async def search_books(request, body):
+    query = body.get("query")
+    search_scope = body.get("search_scope")
+    store_id = body.get("store_id")
+    page = body.get("page", 1)
+    code, message, books = await database.run_sync(
+        lambda s: user.User(s).search_books(query=query, search_scope=search_scope, store_id=store_id, page=page)
+    )
+    return {"message": message, "books": books}, code
+
+
+@post("/buyer/new_order", login_required=True)
+async def new_order(request, body):
+    user_id = body.get("user_id")
+    store_id = body.get("store_id")
+    id_and_count = [(book.get("id"), book.get("count")) for book in body.get("books")]
+    code, message, order_id = await database.run_sync(lambda s: Buyer(s).new_order(user_id, store_id, id_and_count))
+    return {"message": message, "order_id": order_id}, code
+
+
+@post("/buyer/new_orders", login_required=True)
+async def new_orders(request, body):
+    user_id = body.get("user_id")
+    store_id_and_books = [
+        (order.get("store_id"), [(book.get("id"), book.get("count")) for book in order.get("books")])
+        for order in body.get("orders")
+    ]
+    code, message, results = await database.run_sync(lambda s: Buyer(s).new_orders(user_id, store_id_and_books))
+    return {"message": message, "orders": results}, code
+
+
+@post("/buyer/payment", login_required=True)
+async def payment(request, body):
+    user_id = body.get("user_id")
+    order_id = body.get("order_id")
+    password = body.get("password")
+    code, message = await database.run_sync(lambda s: Buyer(s).payment(user_id, password, order_id))
+    return {"message": message}, code
+
+
+@post("/buyer/add_funds", login_required=True)
+async def add_funds(request, body):
+    user_id = body.get("user_id")
+    password = body.get("password")
+    add_value = body.get("add_value")
+    code, message = await database.run_sync(lambda s: Buyer(s).add_funds(user_id, password, add_value))
+    return {"message": message}, code
+
+
+@post("/buyer/receive_order", login_required=True)
+async def receive_order(request, body):
+    user_id = body.get("user_id")
+    order_id = body.get("order_id")
+    code, message = await database.run_sync(lambda s: Buyer(s).receive_order(user_id, order_id))
+    return {"message": message}, code
+
+
+@post("/buyer/buyer_order_cancel", login_required=True)
+async def buyer_order_cancel(request, body):
+    user_id = body.get("user_id")
+    order_id = body.get("order_id")
+    code, message = await database.run_sync(lambda s: Buyer(s).buyer_order_cancel(user_id, order_id))
+    return {"message": message}, code
+
+
+@post("/buyer/history_order", login_required=True)
+async def history_order(request, body):
+    user_id = body.get("user_id")
+    cursor = body.get("cursor")
+    page_size = body.get("page_size")
+    code, message, orders, next_cursor = await database.run_sync(
+        lambda s: Buyer(s).history_order(user_id, cursor, page_size)
+    )
+    return {"message": message, "orders": orders, "next_cursor": next_cursor}, code
+
+
+@post("/buyer/overtime_order_cancel", login_required=True)
+async def overtime_order_cancel(request, body):
+    code, message = await database.run_sync(lambda s: Buyer(s).overtime_order_cancel())
+    return {"message": message}, code
+
+
+@post("/seller/create_store", login_required=True)
+async def seller_create_store(request, body):
+    user_id = body.get("user_id")
+    store_id = body.get("store_id")
+    code, message = await database.run_sync(lambda s: Seller(s).create_store(user_id, store_id))
+    return {"message": message}, code
+
+
+# 分词是 CPU 密集的纯 Python 代码，在线程池中预先完成，不阻塞事件循环；run_sync 中只做数据库写入
+async def tokenize_books(book_infos: [dict]) -> dict:
+    if len(book_infos) > Seller.max_batch_books:
+        return None
+    tokens = await asyncio.get_running_loop().run_in_executor(None, search.books_tokens, book_infos)
+    return {book_info.get("id"): book_tokens for book_info, book_tokens in zip(book_infos, tokens)}
+
+
+@post("/seller/add_book", login_required=True)
+async def seller_add_book(request, body):
+    user_id = body.get("user_id")
+    store_id = body.get("store_id")
+    book_info = body.get("book_info")
+    stock_level = body.get("stock_level", 0)
+    book_tokens = await tokenize_books([book_info])
+    code, message = await database.run_sync(
+        lambda s: Seller(s).add_book(
+            user_id, store_id, book_info.get("id"), json.dumps(book_info), stock_level, book_tokens
+        )
+    )
+    return {"message": message}, code
+
+
+@post("/seller/add_books", login_required=True)
+async def seller_add_books(request, body):
+    user_id = body.get("user_id")
+    store_id = body.get("store_id")
+    book_infos = [book.get("book_info") for book in body.get("books")]
+    id_info_and_stock = [
+        (book.get("book_info").get("id"), json.dumps(book.get("book_info")), book.get("stock_level", 0))
+        for book in body.get("books")
+    ]
+    book_tokens = await tokenize_books(book_infos)
+    code, message = await database.run_sync(
+        lambda s: Seller(s).add_books(user_id, store_id, id_info_and_stock, book_tokens)
+    )
+    return {"message": message}, code
+
+
+@post("/seller/add_stock_level", login_required=True)
+async def add_stock_level(request, body):
+    user_id = body.get("user_id")
+    store_id = body.get("store_id")
+    book_id = body.get("book_id")
+    add_num = body.get("add_stock_level", 0)
+    code, message = await database.run_sync(lambda s: Seller(s).add_stock_level(user_id, store_id, book_id, add_num))
+    return {"message": message}, code
+
+
+@post("/seller/ship_order", login_required=True)
+async def ship_order(request, body):
+    user_id = body.get("user_id")
+    store_id = body.get("store_id")
+    order_id = body.get("order_id")
+    code, message = await database.run_sync(lambda s: Seller(s).ship_order(user_id, store_id, order_id))
+    return {"message": message}, code
+
+
+async def get_metrics(request):
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+# 只在 asgi_run 启动的测试服务器上可用
+async def shutdown(request):
+    if server is not None:
+        server.should_exit = True
+    return PlainTextResponse("Server shutting down...")
+
+
+# 与 OrderReaper 相同：定期分批取消超时未付款的订单
+async def reap_orders(interval: float = 60):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            while True:
+                n = await database.run_sync(lambda s: Buyer(s).cancel_expired_orders())
+                if n < Buyer.expire_batch_size:
+                    break
+        except Exception as e:
+            logging.error("order reaper: {}".format(str(e)))
+
+
+# 每个工作进程启动时各自建立数据库连接池
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    global database
+    metrics.set_info(server="uvicorn")
+    database = store.AsyncStoreORM(serve.db_config())
+    await database.init_tables()
+    reaper = asyncio.create_task(reap_orders())
+    try:
+        yield
+    finally:
+        reaper.cancel()
+        await database.engine.dispose()
+
+
+def create_app() -> Starlette:
+    return Starlette(
+        routes=routes + [Route("/metrics", get_metrics, methods=["GET"])],
+        lifespan=lifespan,
+    )
+
+
+app = create_app()
+
+
+def asgi_run(host: str = "127.0.0.1", port: int = 5000):
+    global server
+    serve.init_logging()
+    test_app = create_app()
+    test_app.router.routes.append(Route("/shutdown", shutdown, methods=["GET"]))
+    server = uvicorn.Server(uvicorn.Config(
+        test_app,
+        host=host,
+        port=port,
+        backlog=int(os.environ.get('BE_BACKLOG', 2048)),
+        timeout_keep_alive=int(os.environ.get('BE_KEEPALIVE', 5)),
+        log_level="warning",
+    ))
+    server.run()
+
+
+if __name__ == "__main__":
+    asgi_run()
@@ -1,127 +1,321 @@
 import uuid
-import json
 import logging
 
 from sqlalchemy.exc import NoResultFound
 
 from be.model.db_conn import DBConn
 from be.model import error
-from datetime import datetime
+from be.model import metrics
+from datetime import datetime, timedelta
 from be.model import store
-from sqlalchemy import and_
+from sqlalchemy import and_, or_, case, insert, select, exists, func
+from sqlalchemy.orm import aliased
 
 class Buyer(DBConn):
-    def __init__(self):
-        DBConn.__init__(self)
+    max_batch_orders: int = 1000  # 单次批量下单的订单数上限
+    order_timeout: int = 12 * 60  # 未付款订单的超时时间（秒）
+    expire_batch_size: int = 500  # 每批取消的超时订单数
+    history_page_size: int = 20  # 历史订单默认每页订单数
+    max_history_page_size: int = 100  # 历史订单每页订单数上限
 
-    # 创建新订单方法
+    def __init__(self, session=None):
+        DBConn.__init__(self, session)
+
+    # 创建新订单方法：一次查询取出所有书籍，同一事务内带条件扣减库存、批量写入订单明细，只提交一次
+    @metrics.instrumented
     def new_order(self, user_id: str, store_id: str, id_and_count: [(str, int)]) -> (int, str, str):
         order_id = ""
         try:
+            self.begin_write()
             if not self.user_id_exist(user_id):
                 return error.error_non_exist_user_id(user_id) + (order_id,)
 
             if not self.store_id_exist(store_id):
                 return error.error_non_exist_store_id(store_id) + (order_id,)
 
-            uid = "{}_{}_{}".format(user_id, store_id, str(uuid.uuid1()))
+            invalid = self.invalid_count(id_and_count)
+            if invalid is not None:
+                return error.error_invalid_parameter("count of book {}".format(invalid[0])) + (order_id,)
 
-            for book_id, count in id_and_count:
-                store_book = self.session.query(store.Store).filter_by(store_id=store_id, book_id=book_id).first()
-                if store_book is None:
-                    return error.error_non_exist_book_id(book_id) + (order_id,)
+            id_and_count = self.merge_id_and_count(id_and_count)
+            store_books = self.get_store_books([(store_id, book_id) for book_id, _ in id_and_count])
 
-                stock_level = store_book.stock_level
-                book_info = json.loads(store_book.book_info)
-                price = book_info["price"]
+            code, message, order_id = self.place_order(user_id, store_id, id_and_count, store_books)
+            if code != 200:
+                self.session.rollback()
+                return code, message, ""
 
-                if stock_level < count:
-                    return error.error_stock_level_low(book_id) + (order_id,)
+            self.session.commit()
+        except Exception as e:
+            self.session.rollback()
+            logging.error(str(e))
+            return 500, "Internal Server Error", ""
 
-                self.session.query(store.Store).filter_by(store_id=store_id, book_id=book_id).update(
-                    {"stock_level": store_book.stock_level - count})
-                self.session.commit()
+        return 200, "ok", order_id
 
-                new_order_detail = store.NewOrderDetail(
-                    order_id=uid,
-                    book_id=book_id,
-                    count=count,
-                    price=price
-                )
-                self.session.add(new_order_detail)
+    # 批量创建订单：共享用户、商铺、书籍的查询，每个订单一个保存点，整批只提交一次
+    @metrics.instrumented
+    def new_orders(self, user_id: str, orders: [(str, [(str, int)])]) -> (int, str, [dict]):
+        results = []
+        try:
+            self.begin_write()
+            if len(orders) > self.max_batch_orders:
+                return error.error_batch_too_large(self.max_batch_orders) + (results,)
 
-            new_order = store.Orders(
-                order_id=uid,
-                user_id=user_id,
-                store_id=store_id,
-                status=1
-            )
-            self.session.add(new_order)
-            self.session.commit()
+            if not self.user_id_exist(user_id):
+                return error.error_non_exist_user_id(user_id) + (results,)
+
+            # 数量不合法的订单记下第一个出错的 (book_id, count)，不参与合并和查询
+            checked = []
+            for store_id, id_and_count in orders:
+                invalid = self.invalid_count(id_and_count)
+                if invalid is None:
+                    id_and_count = self.merge_id_and_count(id_and_count)
+                checked.append((store_id, invalid, id_and_count))
+            orders = checked
+            store_ids = {store_id for store_id, _, _ in orders}
+            exist_store_ids = {
+                row.store_id
+                for row in self.session.query(store.UserStore.store_id).filter(store.UserStore.store_id.in_(store_ids))
+            }
+            store_books = self.get_store_books([
+                (store_id, book_id)
+                for store_id, invalid, id_and_count in orders
+                if store_id in exist_store_ids and invalid is None
+                for book_id, _ in id_and_count
+            ])
+
+            for store_id, invalid, id_and_count in orders:
+                if store_id not in exist_store_ids:
+                    code, message = error.error_non_exist_store_id(store_id)
+                    order_id = ""
+                elif invalid is not None:
+                    code, message = error.error_invalid_parameter("count of book {}".format(invalid[0]))
+                    order_id = ""
+                else:
+                    savepoint = self.session.begin_nested()
+                    code, message, order_id = self.place_order(user_id, store_id, id_and_count, store_books)
+                    if code == 200:
+                        savepoint.commit()
+                    else:
+                        savepoint.rollback()
+                results.append({"code": code, "message": message, "order_id": order_id})
 
-            order_id = uid
+            self.session.commit()
         except Exception as e:
+            self.session.rollback()
             logging.error(str(e))
-            return 500, "Internal Server Error", order_id
-
-        return 200, "ok", order_id
+            return 500, "Internal Server Error", []
+
+        return 200, "ok", results
+
+    # 购买数量必须是正整数（bool 也是 int 的子类，一并排除），返回第一个不合法的 (book_id, count)，都合法时返回 None。
+    # 数量为负时库存条件总能满足，扣减会变成增加库存，总价也会变成负数
+    @staticmethod
+    def invalid_count(id_and_count: [(str, int)]):
+        for book_id, count in id_and_count:
+            if not isinstance(count, int) or isinstance(count, bool) or count <= 0:
+                return book_id, count
+        return None
+
+    # 合并同一订单中重复出现的书籍，保持原有顺序
+    @staticmethod
+    def merge_id_and_count(id_and_count: [(str, int)]) -> [(str, int)]:
+        merged = {}
+        for book_id, count in id_and_count:
+            merged[book_id] = merged.get(book_id, 0) + count
+        return list(merged.items())
+
+    # 一次查询取出 (store_id, book_id) 对应的库存与价格，并按主键顺序对商铺库存行加锁
+    def get_store_books(self, store_and_book_ids: [(str, str)]) -> dict:
+        store_ids = {store_id for store_id, _ in store_and_book_ids}
+        book_ids = {book_id for _, book_id in store_and_book_ids}
+        if not store_ids or not book_ids:
+            return {}
+
+        rows = (
+            self.session.query(
+                store.Store.store_id,
+                store.Store.book_id,
+                store.Store.stock_level,
+                func.coalesce(store.Store.price, store.Book.price).label("price"),
+            )
+            .join(store.Book, store.Book.book_id == store.Store.book_id)
+            .filter(store.Store.store_id.in_(store_ids), store.Store.book_id.in_(book_ids))
+            .order_by(store.Store.store_id, store.Store.book_id)
+            .with_for_update(of=store.Store)
+            .all()
+        )
+
+        store_books = {}
+        for row in rows:
+            store_books[(row.store_id, row.book_id)] = [row.stock_level, row.price]
+        return store_books
+
+    # 在当前事务中下单（不提交）：带条件扣减库存并批量插入订单明细
+    def place_order(self, user_id: str, store_id: str, id_and_count: [(str, int)], store_books: dict) -> (int, str, str):
+        for book_id, count in id_and_count:
+            store_book = store_books.get((store_id, book_id))
+            if store_book is None:
+                return error.error_non_exist_book_id(book_id) + ("",)
+            if store_book[0] < count:
+                return error.error_stock_level_low(book_id) + ("",)
+
+        uid = "{}_{}_{}".format(user_id, store_id, str(uuid.uuid1()))
+
+        if id_and_count:
+            counts = dict(id_and_count)
+            count_of_book = case(counts, value=store.Store.book_id)
+            updated = (
+                self.session.query(store.Store)
+                .filter(
+                    store.Store.store_id == store_id,
+                    store.Store.book_id.in_(counts.keys()),
+                    store.Store.stock_level >= count_of_book,
+                )
+                .update({store.Store.stock_level: store.Store.stock_level - count_of_book}, synchronize_session=False)
+            )
+            if updated != len(counts):
+                # 扣减过的行库存等于加锁时读到的库存减去数量，其余的行没有通过库存条件
+                stock_levels = dict(
+                    self.session.query(store.Store.book_id, store.Store.stock_level).filter(
+                        store.Store.store_id == store_id, store.Store.book_id.in_(counts.keys())
+                    )
+                )
+                low_book_id = next(
+                    (
+                        book_id for book_id, count in id_and_count
+                        if stock_levels.get(book_id) != store_books[(store_id, book_id)][0] - count
+                    ),
+                    id_and_count[0][0],
+                )
+                return error.error_stock_level_low(low_book_id) + ("",)
+
+            self.session.execute(
+                insert(store.NewOrderDetail),
+                [
+                    {
+                        "order_id": uid,
+                        "book_id": book_id,
+                        "count": count,
+                        "price": store_books[(store_id, book_id)][1],
+                    }
+                    for book_id, count in id_and_count
+                ],
+            )
 
+        total_price = 0
+        for book_id, count in id_and_count:
+            store_book = store_books[(store_id, book_id)]
+            store_book[0] -= count
+            if store_book[1] is not None:
+                total_price += store_book[1] * count
+
+        new_order = store.Orders(
+            order_id=uid,
+            user_id=user_id,
+            store_id=store_id,
+            status=1,
+            total_price=total_price
+        )
+        self.session.add(new_order)
+
+        return 200, "ok", uid
+
+    # 付款：订单总价在下单时已算好，付款在一个事务内完成，按固定顺序锁住买家和卖家
+    @metrics.instrumented
     def payment(self, user_id: str, password: str, order_id: str) -> (int, str):
         try:
-            order_data = self.session.query(store.Orders).filter_by(order_id=order_id).first()
+            self.begin_write()
+            order_data = self.get_order_with_seller(order_id)
             if order_data is None:
                 return error.error_invalid_order_id(order_id)
 
-            buyer_id = order_data.user_id
-            store_id = order_data.store_id
-            status = order_data.status
-
-            if status != 1:
+            if order_data.status != 1:
                 return 520, "error_invalid_order_status({})".format(order_id)
 
-            if buyer_id != user_id:
+            if order_data.user_id != user_id:
                 return error.error_authorization_fail()
 
-            user_data = self.session.query(store.User).filter_by(user_id=buyer_id).first()
+            seller_id = order_data.seller_id
+            if seller_id is None:
+                return error.error_non_exist_store_id(order_data.store_id)
+
+            users = self.lock_users([user_id, seller_id])
+            user_data = users.get(user_id)
             if user_data is None:
-                return error.error_non_exist_user_id(buyer_id)
+                self.session.rollback()
+                return error.error_non_exist_user_id(user_id)
 
-            balance = user_data.balance
             if password != user_data.password:
+                self.session.rollback()
                 return error.error_authorization_fail()
 
-            store_data = self.session.query(store.UserStore).filter_by(store_id=store_id).first()
-            if store_data is None:
-                return error.error_non_exist_store_id(store_id)
-
-            seller_id = store_data.user_id
-
-            if not self.user_id_exist(seller_id):
+            if seller_id not in users:
+                self.session.rollback()
                 return error.error_non_exist_user_id(seller_id)
 
-            total_price = 0
+            total_price = order_data.total_price
+            if user_data.balance < total_price:
+                self.session.rollback()
+                return error.error_not_sufficient_funds(order_id)
 
-            order_details = self.session.query(store.NewOrderDetail).filter_by(order_id=order_id)
-            for detail in order_details:
-                count = detail.count
-                price = detail.price
-                total_price += price * count
+            # 比较并交换订单状态，防止重复付款
+            updated = self.session.query(store.Orders).filter(
+                store.Orders.order_id == order_id, store.Orders.status == 1
+            ).update({store.Orders.status: 2})
+            if updated != 1:
+                self.session.rollback()
+                return 520, "error_invalid_order_status({})".format(order_id)
 
-            if balance < total_price:
+            debited = self.session.query(store.User).filter(
+                store.User.user_id == user_id, store.User.balance >= total_price
+            ).update({store.User.balance: store.User.balance - total_price})
+            if debited != 1:
+                self.session.rollback()
                 return error.error_not_sufficient_funds(order_id)
-            self.session.query(store.User).filter(store.User.user_id == buyer_id, store.User.balance >= total_price).update({store.User.balance: (store.User.balance - total_price)})
-            self.session.query(store.User).filter_by(user_id=seller_id).update({"balance": user_data.balance + total_price})
-            self.session.query(store.NewOrderDetail).filter_by(order_id=order_id).delete()
-            self.session.query(store.Orders).filter_by(order_id=order_id).update({"status": 2})
+
+            self.session.query(store.User).filter(store.User.user_id == seller_id).update(
+                {store.User.balance: store.User.balance + total_price})
             self.session.commit()
         except Exception as e:
+            self.session.rollback()
             logging.info("Error: {}".format(str(e)))
             return 500, "Internal Server Error"
 
         return 200, "ok"
+
+    # 一次查询取出订单及其所属商铺的卖家
+    def get_order_with_seller(self, order_id: str):
+        return (
+            self.session.query(
+                store.Orders.user_id,
+                store.Orders.store_id,
+                store.Orders.status,
+                store.Orders.total_price,
+                store.UserStore.user_id.label("seller_id"),
+            )
+            .outerjoin(store.UserStore, store.UserStore.store_id == store.Orders.store_id)
+            .filter(store.Orders.order_id == order_id)
+            .first()
+        )
+
+    # 按 user_id 顺序对用户行加锁，所有转账都使用同一加锁顺序，避免死锁
+    def lock_users(self, user_ids: [str]) -> dict:
+        rows = (
+            self.session.query(store.User.user_id, store.User.password, store.User.balance)
+            .filter(store.User.user_id.in_(set(user_ids)))
+            .order_by(store.User.user_id)
+            .with_for_update()
+            .all()
+        )
+        return {row.user_id: row for row in rows}
+
     # 用户充值方法
+    @metrics.instrumented
     def add_funds(self, user_id, password, add_value) -> (int, str):
         try:
+            self.begin_write()
             user_data = self.session.query(store.User).filter_by(user_id=user_id).first()
             if user_data is None:
                 return error.error_authorization_fail()
@@ -137,8 +331,10 @@ class Buyer(DBConn):
 
         return 200, "ok"
 
+    @metrics.instrumented
     def receive_order(self, user_id, order_id):
         try:
+            self.begin_write()
             if not self.user_id_exist(user_id):
                 return error.error_non_exist_user_id(user_id) + (order_id,)
 
@@ -158,98 +354,173 @@ class Buyer(DBConn):
 
         return 200, "Order received successfully"
 
+    @metrics.instrumented
     def buyer_order_cancel(self, user_id: str, order_id: str) -> (int, str):
-        store_id = ""
         try:
+            self.begin_write()
             if not self.user_id_exist(user_id):
                 return error.error_non_exist_user_id(user_id)
 
-            order = self.session.query(store.Orders).filter_by(order_id=order_id).first()
+            order = self.get_order_with_seller(order_id)
             if order is None:
                 return error.error_invalid_order_id(order_id)
 
-            if order.status == 1:
-                if order.user_id != user_id:
-                    return error.error_authorization_fail()
-
-                self.session.query(store.Orders).filter_by(order_id=order_id).update({"status": 3})
-                self.session.commit()
-            elif order.status == 2:
-                if order.user_id != user_id:
-                    return error.error_authorization_fail()
-
-                store_id = order.store_id
-                price = order.price
-
-                user_store = self.session.query(store.UserStore).filter_by(store_id=store_id).first()
-                seller_id = user_store.user_id
-
-                self.session.query(store.User).filter_by(user_id=seller_id).update({"balance": store.User.balance + price})
-                self.session.query(store.User).filter_by(user_id=user_id).update({"balance": store.User.balance - price})
-                self.session.query(store.NewOrderDetail).filter_by(order_id=order_id).delete()
-                self.session.query(store.Orders).filter_by(order_id=order_id).update({"status": 3})
-                self.session.commit()
-            else:
+            if order.status not in (1, 2) or order.user_id != user_id:
                 return error.error_authorization_fail()
 
-            orders = self.session.query(store.NewOrderDetail).filter_by(order_id=order_id)
-            for order in orders:
-                book_id = order.book_id
-                count = order.count
-
-                self.session.query(store.Store).filter_by(store_id=store_id, book_id=book_id).update({"stock_level": store.Store.stock_level + count})
+            if order.status == 2:
+                # 已付款订单退款：与付款相同的加锁顺序，卖家扣回、买家返还
+                self.lock_users([user_id, order.seller_id])
+                refunded = self.session.query(store.User).filter(
+                    store.User.user_id == order.seller_id, store.User.balance >= order.total_price
+                ).update({store.User.balance: store.User.balance - order.total_price})
+                if refunded != 1:
+                    self.session.rollback()
+                    return error.error_not_sufficient_funds(order_id)
+                self.session.query(store.User).filter(store.User.user_id == user_id).update(
+                    {store.User.balance: store.User.balance + order.total_price})
+
+            updated = self.session.query(store.Orders).filter(
+                store.Orders.order_id == order_id, store.Orders.status == order.status
+            ).update({store.Orders.status: 3})
+            if updated != 1:
+                self.session.rollback()
+                return 520, "error_invalid_order_status({})".format(order_id)
 
+            self.restore_stock([order_id])
             self.session.commit()
         except Exception as e:
+            self.session.rollback()
             logging.info("Error: {}".format(str(e)))
             return 500, "Internal Server Error"
 
         return 200, "ok"
 
-    def history_order(self, user_id: str):
+    # 历史订单：按 (created_at, order_id) 倒序做键集分页，订单与明细用一条 JOIN 查询取出
+    @metrics.instrumented
+    def history_order(self, user_id: str, cursor: str = None, page_size: int = None) -> (int, str, [dict], str):
         try:
             if not self.user_id_exist(user_id):
-                return error.error_non_exist_user_id(user_id), None
+                return error.error_non_exist_user_id(user_id) + ([], "")
+
+            # page_size 来自请求体，可能不是整数（bool 也是 int 的子类，一并排除）
+            if page_size is not None and (not isinstance(page_size, int) or isinstance(page_size, bool)):
+                return error.error_invalid_parameter("page_size") + ([], "")
+            if not page_size or page_size <= 0:
+                page_size = self.history_page_size
+            page_size = min(page_size, self.max_history_page_size)
+
+            page_query = self.session.query(store.Orders).filter(store.Orders.user_id == user_id)
+            if cursor:
+                try:
+                    created_at, order_id = self.parse_history_cursor(cursor)
+                except ValueError:
+                    return error.error_invalid_cursor(cursor) + ([], "")
+                page_query = page_query.filter(or_(
+                    store.Orders.created_at < created_at,
+                    and_(store.Orders.created_at == created_at, store.Orders.order_id < order_id),
+                ))
+            page = (
+                page_query.order_by(store.Orders.created_at.desc(), store.Orders.order_id.desc())
+                .limit(page_size)
+                .subquery()
+            )
+            page_order = aliased(store.Orders, page)
 
-            orders = self.session.query(store.Orders).filter_by(user_id=user_id).all()
+            rows = (
+                self.session.query(page_order, store.NewOrderDetail)
+                .outerjoin(store.NewOrderDetail, store.NewOrderDetail.order_id == page_order.order_id)
+                .order_by(page_order.created_at.desc(), page_order.order_id.desc(), store.NewOrderDetail.book_id)
+                .all()
+            )
 
             result = []
-            for order in orders:
-                order_id = order.order_id
-                order_details = self.session.query(store.NewOrderDetail).filter_by(order_id=order_id).all()
-                for detail in order_details:
-                    result.append(detail)
+            for order, detail in rows:
+                if not result or result[-1]["order_id"] != order.order_id:
+                    result.append({
+                        "order_id": order.order_id,
+                        "store_id": order.store_id,
+                        "status": order.status,
+                        "total_price": order.total_price,
+                        "created_at": order.created_at.isoformat(),
+                        "books": [],
+                    })
+                if detail is not None:
+                    result[-1]["books"].append({"book_id": detail.book_id, "count": detail.count, "price": detail.price})
+
+            next_cursor = ""
+            if len(result) == page_size:
+                next_cursor = "{}|{}".format(result[-1]["created_at"], result[-1]["order_id"])
         except Exception as e:
             logging.info("Error: {}".format(str(e)))
-            return 500, "Internal Server Error", None
+            return 500, "Internal Server Error", [], ""
+
+        return 200, "ok", result, next_cursor
+
+    # 游标格式为 "<created_at 的 ISO 时间>|<order_id>"
+    @staticmethod
+    def parse_history_cursor(cursor: str) -> (datetime, str):
+        created_at, sep, order_id = cursor.partition("|")
+        if not sep or not order_id:
+            raise ValueError(cursor)
+        return datetime.fromisoformat(created_at), order_id
+
+    # 归还一批订单占用的库存：一条带关联子查询的 UPDATE 完成，不逐行循环
+    def restore_stock(self, order_ids: [str]):
+        in_orders = and_(
+            store.NewOrderDetail.order_id.in_(order_ids),
+            store.Orders.order_id == store.NewOrderDetail.order_id,
+            store.Orders.store_id == store.Store.store_id,
+            store.NewOrderDetail.book_id == store.Store.book_id,
+        )
+        restored = select(func.sum(store.NewOrderDetail.count)).where(in_orders).correlate(store.Store).scalar_subquery()
+        self.session.query(store.Store).filter(
+            store.Store.store_id.in_(select(store.Orders.store_id).where(store.Orders.order_id.in_(order_ids))),
+            store.Store.book_id.in_(select(store.NewOrderDetail.book_id).where(store.NewOrderDetail.order_id.in_(order_ids))),
+            exists().where(in_orders).correlate(store.Store),
+        ).update({store.Store.stock_level: store.Store.stock_level + restored}, synchronize_session=False)
+
+    # 取消一批超时未付款的订单并归还库存，返回本批取消的订单数
+    # 借助 (status, created_at) 索引只扫描已超时的订单，代价与超时订单数成正比
+    @metrics.instrumented
+    def cancel_expired_orders(self, timeout: int = None, batch_size: int = None) -> int:
+        if timeout is None:
+            timeout = self.order_timeout
+        if batch_size is None:
+            batch_size = self.expire_batch_size
+        deadline = datetime.utcnow() - timedelta(seconds=timeout)
+
+        try:
+            self.begin_write()
+            order_ids = [
+                row.order_id
+                for row in self.session.query(store.Orders.order_id)
+                .filter(store.Orders.status == 1, store.Orders.created_at < deadline)
+                .order_by(store.Orders.created_at)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+            ]
+            if not order_ids:
+                self.session.rollback()
+                return 0
+
+            self.restore_stock(order_ids)
+            self.session.query(store.Orders).filter(
+                store.Orders.order_id.in_(order_ids), store.Orders.status == 1
+            ).update({store.Orders.status: 3}, synchronize_session=False)
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
 
-        return 200, "ok", result
+        return len(order_ids)
 
     def overtime_order_cancel(self):
         try:
-            unpaid_orders = self.session.query(store.Orders).filter_by(status=1).all()
-            current_time = datetime.now()
-            print(current_time)
-            for order in unpaid_orders:
-                order_id = order.order_id
-                # 获取 UUID 时间戳
-                temp = order_id.split("_")
-                l = len(temp)
-                time_ = uuid.UUID(temp[l - 1])
-                # print('1111111111111111')
-                # print(temp)
-                # print('1111111111111111')
-
-
-                order_time = datetime.utcfromtimestamp(time_.time / 1e7)
-                # 定义超时阈值
-                timeout_threshold = 12 * 60
-
-                if (current_time - order_time).total_seconds() > timeout_threshold:
-                    self.buyer_order_cancel(order.user_id, order.order_id)
+            while self.cancel_expired_orders() == self.expire_batch_size:
+                pass
         except Exception as e:
             logging.info("Error: {}".format(str(e)))
             return 500, "Internal Server Error"
 
-
-        return 200, "ok"
\ No newline at end of file
+        return 200, "ok"
@@ -1,8 +1,16 @@
 from be.model import store
 
 class DBConn:
-    def __init__(self):
-        self.session = store.get_db_conn()
+    # session 为空时使用当前线程的会话；异步模式下由 AsyncSession.run_sync 传入
+    def __init__(self, session=None):
+        self.session = session if session is not None else store.get_db_conn()
+
+    # 写方法在第一条查询之前调用：SQLite 上以 BEGIN IMMEDIATE 开始这个事务，先拿到写锁代替
+    # SELECT ... FOR UPDATE 的行锁；只读的请求仍以普通的 BEGIN 开始，WAL 模式下可以并发读。
+    # 其他数据库上没有影响；会话已经在事务中时沿用当前事务
+    def begin_write(self):
+        if not self.session.in_transaction():
+            self.session.connection(execution_options={"begin_immediate": True})
 
     def user_id_exist(self, user_id):
         user = self.session.query(store.User).filter_by(user_id=user_id).first()
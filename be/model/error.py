@@ -10,10 +10,10 @@ error_code = {
     518: "invalid order id {}",
     519: "not sufficient funds, order id {}",
     520: "",
-    521: "",
-    522: "",
-    523: "",
-    524: "",
+    521: "batch too large, limit {}",
+    522: "invalid cursor {}",
+    523: "book info conflicts with catalog, book id {}",
+    524: "invalid parameter {}",
     525: "",
     526: "",
     527: "",
@@ -59,6 +59,22 @@ def error_not_sufficient_funds(order_id):
     return 519, error_code[518].format(order_id)
 
 
+def error_batch_too_large(limit):
+    return 521, error_code[521].format(limit)
+
+
+def error_invalid_cursor(cursor):
+    return 522, error_code[522].format(cursor)
+
+
+def error_book_info_conflict(book_id):
+    return 523, error_code[523].format(book_id)
+
+
+def error_invalid_parameter(name):
+    return 524, error_code[524].format(name)
+
+
 def error_authorization_fail():
     return 401, error_code[401]
 
@@ -0,0 +1,211 @@
+import bisect
+import contextvars
+import functools
+import threading
+import time
+
+from sqlalchemy import event
+
+# 延迟直方图的桶上界（秒）：10 微秒起按 1.25 倍递增，约覆盖到 10 分钟
+LATENCY_BOUNDS = [1e-5 * 1.25 ** i for i in range(80)]
+# SQL 语句条数直方图的桶上界：20 条以内精确统计
+COUNT_BOUNDS = list(range(0, 21)) + [25, 30, 40, 50, 75, 100, 150, 200, 300, 500, 1000, 2000, 5000]
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+# 固定桶的直方图，分位数取所在桶的上界（不超过观测到的最大值）
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def observe(self, value):
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float):
+        if self.count == 0:
+            return 0
+        rank = q * self.count
+        cumulative = 0
+        for i, n in enumerate(self.buckets):
+            cumulative += n
+            if cumulative >= rank:
+                if i < len(self.bounds):
+                    return min(self.bounds[i], self.max)
+                return self.max
+        return self.max
+
+
+# 按标签值分组的一族直方图，例如按路由分组的请求延迟
+class HistogramFamily:
+    def __init__(self, name: str, help_text: str, label: str, bounds):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.bounds = bounds
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def observe(self, label_value: str, value):
+        with self.lock:
+            histogram = self.histograms.get(label_value)
+            if histogram is None:
+                histogram = self.histograms[label_value] = Histogram(self.bounds)
+            histogram.observe(value)
+
+    # 以 Prometheus 文本格式的 summary 输出
+    def render(self) -> [str]:
+        lines = [
+            "# HELP {} {}".format(self.name, self.help_text),
+            "# TYPE {} summary".format(self.name),
+        ]
+        with self.lock:
+            for label_value in sorted(self.histograms):
+                histogram = self.histograms[label_value]
+                label = '{}="{}"'.format(self.label, _escape(label_value))
+                for q in QUANTILES:
+                    lines.append('{}{{{},quantile="{}"}} {}'.format(self.name, label, q, _number(histogram.quantile(q))))
+                lines.append("{}_sum{{{}}} {}".format(self.name, label, _number(histogram.sum)))
+                lines.append("{}_count{{{}}} {}".format(self.name, label, histogram.count))
+        return lines
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+
+
+request_duration = HistogramFamily(
+    "be_request_duration_seconds", "HTTP request latency by route.", "route", LATENCY_BOUNDS)
+request_statements = HistogramFamily(
+    "be_request_sql_statements", "SQL statements issued per HTTP request by route.", "route", COUNT_BOUNDS)
+request_sql_duration = HistogramFamily(
+    "be_request_sql_duration_seconds", "Time spent executing SQL per HTTP request by route.", "route", LATENCY_BOUNDS)
+method_duration = HistogramFamily(
+    "be_model_method_duration_seconds", "Model method latency.", "method", LATENCY_BOUNDS)
+method_statements = HistogramFamily(
+    "be_model_method_sql_statements", "SQL statements issued per model method call.", "method", COUNT_BOUNDS)
+FAMILIES = (request_duration, request_statements, request_sql_duration, method_duration, method_statements)
+
+_statements_total = 0
+_statements_lock = threading.Lock()
+# 当前活动的统计范围；用 contextvars 而不是线程局部变量，异步模式下并发的请求互不干扰
+_scopes = contextvars.ContextVar("metrics_scopes", default=())
+
+
+# 一次请求或一次模型方法调用内的统计；嵌套时语句会同时计入外层
+class Scope:
+    __slots__ = ("start", "statements", "sql_seconds")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.statements = 0
+        self.sql_seconds = 0.0
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+
+def begin_scope() -> Scope:
+    scope = Scope()
+    _scopes.set(_scopes.get() + (scope,))
+    return scope
+
+
+def end_scope(scope: Scope):
+    _scopes.set(tuple(s for s in _scopes.get() if s is not scope))
+
+
+def observe_request(route: str, scope: Scope):
+    request_duration.observe(route, scope.elapsed())
+    request_statements.observe(route, scope.statements)
+    request_sql_duration.observe(route, scope.sql_seconds)
+
+
+# 模型方法装饰器：记录方法耗时和期间执行的 SQL 语句数
+def instrumented(func):
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        scope = begin_scope()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            end_scope(scope)
+            method_duration.observe(name, scope.elapsed())
+            method_statements.observe(name, scope.statements)
+
+    return wrapper
+
+
+# 在引擎上挂载事件钩子，统计每条 SQL 语句的条数和耗时
+def instrument_engine(engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        global _statements_total
+        starts = conn.info.get("metrics_start")
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        for scope in _scopes.get():
+            scope.statements += 1
+            scope.sql_seconds += elapsed
+        with _statements_lock:
+            _statements_total += 1
+
+
+# 本进程的部署信息：数据库后端和服务器，在 /metrics 中作为 be_info 的标签输出，
+# 压测据此区分不同部署下的基线
+info = {}
+
+
+def set_info(**labels):
+    info.update(labels)
+
+
+def render() -> str:
+    lines = [
+        "# HELP be_sql_statements_total SQL statements executed.",
+        "# TYPE be_sql_statements_total counter",
+        "be_sql_statements_total {}".format(_statements_total),
+    ]
+    if info:
+        lines.extend([
+            "# HELP be_info Database backend and server of this process.",
+            "# TYPE be_info gauge",
+            "be_info{{{}}} 1".format(",".join(
+                '{}="{}"'.format(name, value) for name, value in sorted(info.items())
+            )),
+        ])
+    for family in FAMILIES:
+        lines.extend(family.render())
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    global _statements_total
+    with _statements_lock:
+        _statements_total = 0
+    for family in FAMILIES:
+        family.reset()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value) -> str:
+    if isinstance(value, float):
+        return repr(round(value, 9))
+    return str(value)
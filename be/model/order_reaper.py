@@ -0,0 +1,40 @@
+import logging
+import threading
+
+from be.model import store
+from be.model.buyer import Buyer
+
+
+# 后台清理线程：定期分批取消超时未付款的订单，不再依赖客户端调用 /buyer/overtime_order_cancel
+class OrderReaper(threading.Thread):
+    def __init__(self, interval: float = 60, timeout: int = None, batch_size: int = None):
+        threading.Thread.__init__(self, name="order-reaper", daemon=True)
+        self.interval = interval
+        self.timeout = Buyer.order_timeout if timeout is None else timeout
+        self.batch_size = Buyer.expire_batch_size if batch_size is None else batch_size
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.reap()
+
+    # 循环取消超时订单，直到某一批不满 batch_size，返回取消的订单总数
+    def reap(self) -> int:
+        total = 0
+        try:
+            b = Buyer()
+            while not self.stop_event.is_set():
+                n = b.cancel_expired_orders(self.timeout, self.batch_size)
+                total += n
+                if n < self.batch_size:
+                    break
+        except Exception as e:
+            logging.error("order reaper: {}".format(str(e)))
+        finally:
+            store.remove_db_conn()
+        if total:
+            logging.info("order reaper cancelled {} expired orders".format(total))
+        return total
+
+    def stop(self):
+        self.stop_event.set()
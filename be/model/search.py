@@ -0,0 +1,96 @@
+import re
+import os
+import atexit
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from jieba import cut_for_search  # 用于中文分词
+
+# 可检索的字段，对应 search_scope
+SEARCH_FIELDS = ("title", "tag", "content", "book_intro")
+MAX_TOKEN_LENGTH = 64
+# 批量分词时少于该数量的书直接在当前进程处理，避免进程间传输的开销
+PARALLEL_THRESHOLD = 64
+# 多进程部署时各工作进程已经占满 CPU，只有大批量才值得交给进程池
+MULTI_WORKER_PARALLEL_THRESHOLD = 1000
+
+# 分词进程池的大小（每个子进程都要加载 jieba 词典），BE_SEARCH_POOL_SIZE 为 0 时不使用进程池
+pool_size = int(os.environ.get("BE_SEARCH_POOL_SIZE", min(os.cpu_count() or 1, 4)))
+parallel_threshold = int(os.environ.get("BE_SEARCH_PARALLEL_THRESHOLD", PARALLEL_THRESHOLD))
+
+_pool: ProcessPoolExecutor = None
+_pool_lock = threading.Lock()
+
+_word = re.compile(r"\w")
+
+
+# 把一段文本切成去重后的检索词：统一小写，丢弃空白、标点和过长的词
+def tokenize(text) -> set:
+    if not text:
+        return set()
+    tokens = set()
+    for token in cut_for_search(str(text)):
+        token = token.strip().lower()
+        if token and len(token) <= MAX_TOKEN_LENGTH and _word.search(token):
+            tokens.add(token)
+    return tokens
+
+
+# 生成一本书在各检索字段上的 (field, token) 列表，用于写入倒排索引
+def book_tokens(book_json: dict) -> [(str, str)]:
+    tags_tokens = set()
+    for tag in book_json.get("tags") or []:
+        tags_tokens |= tokenize(tag)
+    field_tokens = {
+        "title": tokenize(book_json.get("title")),
+        "tag": tags_tokens,
+        "content": tokenize(book_json.get("content")),
+        "book_intro": tokenize(book_json.get("book_intro")),
+    }
+    return [(field, token) for field in SEARCH_FIELDS for token in field_tokens[field]]
+
+
+# 调整进程池大小和并行分词的批量下限，已建立的进程池会被关闭，下次使用时按新大小重建
+def configure(size: int = None, threshold: int = None):
+    global pool_size, parallel_threshold
+    if size is not None:
+        pool_size = size
+        shutdown_pool()
+    if threshold is not None:
+        parallel_threshold = threshold
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # 服务端是多线程的，使用 spawn 避免 fork 时复制其他线程持有的锁
+            _pool = ProcessPoolExecutor(
+                max_workers=pool_size,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+# 关闭进程池并回收子进程，进程退出时自动调用；多进程部署时由工作进程退出的钩子调用
+@atexit.register
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+# 批量分词：数量较多时分块交给进程池并行处理（jieba 是纯 Python，线程无法并行）
+def books_tokens(book_jsons: [dict]) -> [[(str, str)]]:
+    if pool_size <= 0 or len(book_jsons) < parallel_threshold:
+        return [book_tokens(book_json) for book_json in book_jsons]
+    try:
+        pool = _get_pool()
+        chunksize = max(1, len(book_jsons) // (4 * pool_size))
+        return list(pool.map(book_tokens, book_jsons, chunksize=chunksize))
+    except Exception as e:
+        logging.error("parallel tokenize failed, fall back to serial: {}".format(str(e)))
+        return [book_tokens(book_json) for book_json in book_jsons]
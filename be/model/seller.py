@@ -2,20 +2,64 @@ import json
 from be.model import store
 
 from be.model import error
+from be.model import metrics
+from be.model import search
 from be.model.db_conn import DBConn
-from jieba import cut  # 用于中文分词
-import re
-from sqlalchemy.orm import aliased
+from sqlalchemy import insert, exists
+from sqlalchemy.exc import IntegrityError
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# 把客户端提交的书本 JSON 转换为 Book 表的一行
+def book_row(book_id: str, book_json: dict) -> dict:
+    return {
+        "book_id": book_id,
+        "title": book_json.get("title"),
+        "author": book_json.get("author"),
+        "publisher": book_json.get("publisher"),
+        "original_title": book_json.get("original_title"),
+        "translator": book_json.get("translator"),
+        "pub_year": book_json.get("pub_year"),
+        "pages": _to_int(book_json.get("pages")),
+        "price": _to_int(book_json.get("price")),
+        "currency_unit": book_json.get("currency_unit"),
+        "binding": book_json.get("binding"),
+        "isbn": book_json.get("isbn"),
+        "author_intro": book_json.get("author_intro"),
+        "book_intro": book_json.get("book_intro"),
+        "content": book_json.get("content"),
+        "tags": json.dumps(book_json.get("tags") or [], ensure_ascii=False),
+        "pictures": json.dumps(book_json.get("pictures") or [], ensure_ascii=False),
+    }
+
+
+# 同一 book_id 在各商铺间必须一致的描述信息；价格可以由商铺各自定价，图片以目录为准
+CATALOG_FIELDS = (
+    "title", "author", "publisher", "original_title", "translator", "pub_year", "pages",
+    "currency_unit", "binding", "isbn", "author_intro", "book_intro", "content", "tags",
+)
 
 
 class Seller(DBConn):
-    def __init__(self):
-        DBConn.__init__(self)
+    max_batch_books: int = 10000  # 单次批量上架的书本数上限
 
+    def __init__(self, session=None):
+        DBConn.__init__(self, session)
+
+    # book_tokens 为调用方预先算好的分词结果 {book_id: [(field, token)]}，为空时在此分词
+    @metrics.instrumented
     def add_book(
-            self, user_id: str, store_id: str, book_id: str, book_json_str: str, stock_level: int
+            self, user_id: str, store_id: str, book_id: str, book_json_str: str, stock_level: int,
+            book_tokens: dict = None,
     ):
         try:
+            self.begin_write()
             if not self.user_id_exist(user_id):
                 return error.error_non_exist_user_id(user_id)
             if not self.store_id_exist(store_id):
@@ -23,39 +67,135 @@ class Seller(DBConn):
             if self.book_id_exist(store_id, book_id):
                 return error.error_exist_book_id(book_id)
 
-            book_json = json.loads(book_json_str)
-
-            # 为search做准备
-            title = book_json.get("title", [])
-            tags = book_json.get("tags", [])
-            content = book_json.get("content", [])
-            book_intro = book_json.get("book_intro", [])
+            code, message, prices = self.add_catalog_books([(book_id, book_json_str, stock_level)], book_tokens)
+            if code != 200:
+                self.session.rollback()
+                return code, message
 
-            # 执行分词操作
-            tags_tokens = " ".join(tags)
-            content_tokens = " ".join(cut(content))
-            book_intro_tokens = " ".join(cut(book_intro))
-            detail_book = str(title) + " " + str(tags_tokens) + " " + str(content_tokens) + " " + str(book_intro_tokens)
-
-            # 在MySQL中插入书本信息
+            # 商铺中只保存库存，以及与目录不同时的商铺定价
             new_book = store.Store(
                 store_id=store_id,
                 book_id=book_id,
-                book_info=book_json_str,
                 stock_level=stock_level,
-                detail_book=detail_book,
+                price=prices[book_id],
             )
             self.session.add(new_book)
             self.session.commit()
 
         except Exception as e:
+            self.session.rollback()
+            return 530, "{}".format(str(e))
+        return 200, "ok"
+
+    # 批量上架：一次查询校验用户和商铺，一次查询找出已存在的书，
+    # 并行分词后多行插入，整批只提交一次；任何一本书出错则整批不生效
+    @metrics.instrumented
+    def add_books(self, user_id: str, store_id: str, books: [(str, str, int)], book_tokens: dict = None):
+        try:
+            self.begin_write()
+            if len(books) > self.max_batch_books:
+                return error.error_batch_too_large(self.max_batch_books)
+
+            user_exist, store_exist = self.session.query(
+                exists().where(store.User.user_id == user_id),
+                exists().where(store.UserStore.store_id == store_id),
+            ).one()
+            if not user_exist:
+                return error.error_non_exist_user_id(user_id)
+            if not store_exist:
+                return error.error_non_exist_store_id(store_id)
+
+            book_ids = [book_id for book_id, _, _ in books]
+            seen = set()
+            for book_id in book_ids:
+                if book_id in seen:
+                    return error.error_exist_book_id(book_id)
+                seen.add(book_id)
+            if not book_ids:
+                return 200, "ok"
+
+            exist_book = (
+                self.session.query(store.Store.book_id)
+                .filter(store.Store.store_id == store_id, store.Store.book_id.in_(book_ids))
+                .first()
+            )
+            if exist_book is not None:
+                return error.error_exist_book_id(exist_book.book_id)
+
+            code, message, prices = self.add_catalog_books(books, book_tokens)
+            if code != 200:
+                self.session.rollback()
+                return code, message
+
+            self.session.execute(insert(store.Store), [
+                {"store_id": store_id, "book_id": book_id, "stock_level": stock_level, "price": prices[book_id]}
+                for book_id, _, stock_level in books
+            ])
+            self.session.commit()
+
+        except Exception as e:
+            self.session.rollback()
             return 530, "{}".format(str(e))
         return 200, "ok"
 
+    # 把目录中还没有的书写入图书目录和倒排索引；与其他商铺并发写入同一本书时主键冲突，重试一次。
+    # 目录中已有的书描述信息须与提交的一致，否则返回 523；
+    # 返回 (code, message, {book_id: 商铺定价})，提交的价格与目录相同时商铺定价为 None
+    def add_catalog_books(self, books: [(str, str, int)], book_tokens: dict = None) -> (int, str, dict):
+        book_jsons = {book_id: json.loads(book_json_str) for book_id, book_json_str, _ in books}
+        rows = {book_id: book_row(book_id, book_json) for book_id, book_json in book_jsons.items()}
+        columns = [store.Book.book_id, store.Book.price] + [getattr(store.Book, field) for field in CATALOG_FIELDS]
+        for attempt in range(2):
+            query = self.session.query(*columns).filter(store.Book.book_id.in_(rows))
+            if attempt:
+                # MySQL 可重复读下事务内的普通 SELECT 仍读第一次查询时的快照，看不到其他商铺刚提交的书；
+                # 重试时用加锁读（LOCK IN SHARE MODE）读取最新提交的数据
+                query = query.with_for_update(read=True)
+            catalog = {row.book_id: row for row in query}
+            for book_id, catalog_row in catalog.items():
+                if any(getattr(catalog_row, field) != rows[book_id][field] for field in CATALOG_FIELDS):
+                    return error.error_book_info_conflict(book_id) + (None,)
+            prices = {
+                book_id: row["price"] if book_id in catalog and row["price"] != catalog[book_id].price else None
+                for book_id, row in rows.items()
+            }
+
+            new_ids = [book_id for book_id in rows if book_id not in catalog]
+            if not new_ids:
+                return 200, "ok", prices
+
+            if book_tokens is not None:
+                tokens = [book_tokens[book_id] for book_id in new_ids]
+            else:
+                tokens = search.books_tokens([book_jsons[book_id] for book_id in new_ids])
+            try:
+                with self.session.begin_nested():
+                    self.insert_catalog_books(
+                        [rows[book_id] for book_id in new_ids],
+                        list(zip(new_ids, tokens)),
+                    )
+                return 200, "ok", prices
+            except IntegrityError:
+                if attempt == 1:
+                    raise
+
+    # 在当前事务中写入图书目录和倒排索引（不提交）
+    def insert_catalog_books(self, book_rows: [dict], book_tokens: [(str, [(str, str)])]):
+        self.session.execute(insert(store.Book), book_rows)
+        token_rows = [
+            {"field": field, "token": token, "book_id": book_id}
+            for book_id, tokens in book_tokens
+            for field, token in tokens
+        ]
+        if token_rows:
+            self.session.execute(insert(store.BookToken), token_rows)
+
+    @metrics.instrumented
     def add_stock_level(
             self, user_id: str, store_id: str, book_id: str, add_stock_level: int
     ):
         try:
+            self.begin_write()
             if not self.user_id_exist(user_id):
                 return error.error_non_exist_user_id(user_id)
             if not self.store_id_exist(store_id):
@@ -73,8 +213,10 @@ class Seller(DBConn):
             return 530, "{}".format(str(e))
         return 200, "ok"
 
+    @metrics.instrumented
     def create_store(self, user_id: str, store_id: str) -> (int, str):
         try:
+            self.begin_write()
             if not self.user_id_exist(user_id):
                 return error.error_non_exist_user_id(user_id)
             if self.store_id_exist(store_id):
@@ -89,8 +231,10 @@ class Seller(DBConn):
             return 530, "{}".format(str(e))
         return 200, "ok"
 
+    @metrics.instrumented
     def ship_order(self, user_id: str, store_id: str, order_id: str):
         try:
+            self.begin_write()
             if not self.user_id_exist(user_id):
                 return error.error_non_exist_user_id(user_id)
             if not self.store_id_exist(store_id):
@@ -1,7 +1,14 @@
 import logging
-from sqlalchemy import create_engine, Column, String, Integer, Text, ForeignKey
+import os
+import sqlite3
+from datetime import datetime
+from sqlalchemy import create_engine, event, Column, String, Integer, Text, ForeignKey, DateTime, Index
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from sqlalchemy.dialects import mysql
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, scoped_session
+from be.model import metrics
 
 Base = declarative_base()
 
@@ -23,24 +30,63 @@ class UserStore(Base):
     user_id = Column(String(255), ForeignKey('user.user_id'), primary_key=True)
     store_id = Column(String(255), primary_key=True)  # 添加索引
 
-# 定义 Store 表，用于存储商店信息和图书信息
+# 定义 Book 表，所有商铺共享的图书目录，每本书只存一份
+class Book(Base):
+    __tablename__ = 'book'
+
+    book_id = Column(String(255), primary_key=True, nullable=False)
+    title = Column(String(512), index=True)
+    author = Column(String(255), index=True)
+    publisher = Column(String(255), index=True)
+    original_title = Column(String(512))
+    translator = Column(String(255))
+    pub_year = Column(String(32))
+    pages = Column(Integer)
+    price = Column(Integer)
+    currency_unit = Column(String(32))
+    binding = Column(String(32))
+    isbn = Column(String(32), index=True)
+    author_intro = Column(Text)
+    book_intro = Column(Text)
+    content = Column(Text)
+    tags = Column(Text)  # JSON 数组
+    pictures = Column(Text)  # JSON 数组
+
+# 定义 Store 表，商铺中的图书只保存库存和可选的商铺定价
 class Store(Base):
     __tablename__ = 'store'
 
     store_id = Column(String(255), primary_key=True, nullable=False)
-    book_id = Column(String(255), primary_key=True, nullable=False)  # 确保添加了索引
-    book_info = Column(Text)
+    book_id = Column(String(255), ForeignKey('book.book_id'), primary_key=True, nullable=False)
     stock_level = Column(Integer)
-    detail_book = Column(Text)
+    price = Column(Integer)  # 为空时使用 Book.price
+
+# 定义 BookToken 表：分词后的倒排索引，(field, token) -> 图书
+# 检索词按字符串精确去重，MySQL 上 token 使用二进制排序规则，否则默认排序规则会把
+# 全角与半角（"ｓｑｌ"、"sql"）、带重音与不带重音（"é"、"e"）的词视为相同，插入时主键冲突
+class BookToken(Base):
+    __tablename__ = 'book_token'
+
+    field = Column(String(32), primary_key=True)
+    token = Column(String(64).with_variant(mysql.VARCHAR(64, collation="utf8mb4_bin"), "mysql"), primary_key=True)
+    book_id = Column(String(255), primary_key=True)
 
 # 定义 Orders 表，用于存储订单信息
 class Orders(Base):
     __tablename__ = 'orders'
+    __table_args__ = (
+        # 超时订单清理按 (status, created_at) 范围扫描
+        Index('ix_orders_status_created_at', 'status', 'created_at'),
+        # 历史订单按 (user_id, created_at) 做键集分页
+        Index('ix_orders_user_id_created_at', 'user_id', 'created_at'),
+    )
 
     order_id = Column(String(255), primary_key=True, nullable=False)
-    user_id = Column(String(255), ForeignKey('user.user_id'), index=True)
+    user_id = Column(String(255), ForeignKey('user.user_id'))
     store_id = Column(String(255), index=True)
-    status = Column(Integer, index=True)
+    status = Column(Integer)
+    total_price = Column(Integer, nullable=False, default=0)  # 下单时计算好的订单总价
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
 
 # 定义 NewOrderDetail 表，用于存储订单详细信息
 class NewOrderDetail(Base):
@@ -51,15 +97,95 @@ class NewOrderDetail(Base):
     count = Column(Integer)
     price = Column(Integer)
 
-class StoreORM:
-    def __init__(self, db_config):
-        self.session = None
-        self.engine = create_engine(
-            f"mysql+mysqlconnector://{db_config['user']}:{db_config['password']}@{db_config['host']}/{db_config['database']}",
-            echo=True
+# 为 SQLite 连接做方言相关的设置：
+# 关闭 pysqlite 自带的事务管理，由 SQLAlchemy 发出 BEGIN，保存点才能正常工作；
+# SQLite 不支持 SELECT ... FOR UPDATE，写事务（DBConn.begin_write 设置了 begin_immediate）以 BEGIN IMMEDIATE 开始，
+# 提前拿到写锁代替行锁；只读事务用普通的 BEGIN，不占用写锁
+def _tune_sqlite(engine, wal: bool):
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        if wal:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.execute("PRAGMA busy_timeout=30000")
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def on_begin(connection):
+        if connection.get_execution_options().get("begin_immediate"):
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+        else:
+            connection.exec_driver_sql("BEGIN")
+
+
+# 按后端生成引擎参数，返回 (url, engine 参数, SQLite 是否开启 WAL，非 SQLite 为 None)；
+# use_async 为真时使用异步驱动（aiomysql / aiosqlite）
+def engine_args(db_config, use_async: bool = False):
+    backend = db_config.get('backend', 'mysql')
+    kwargs = {"echo": db_config.get('echo', False)}
+
+    if backend == 'mysql':
+        driver = "aiomysql" if use_async else "mysqlconnector"
+        url = f"mysql+{driver}://{db_config['user']}:{db_config['password']}@{db_config['host']}/{db_config['database']}"
+        kwargs.update(
+            pool_size=db_config.get('pool_size', 10),
+            max_overflow=db_config.get('max_overflow', 20),
+            pool_timeout=db_config.get('pool_timeout', 30),
+            pool_pre_ping=db_config.get('pool_pre_ping', True),
+            pool_recycle=db_config.get('pool_recycle', 3600),
         )
+        return url, kwargs, None
+
+    driver = "sqlite+aiosqlite" if use_async else "sqlite"
+    if backend == 'sqlite':
+        # 基于文件的 SQLite，WAL 模式下读不阻塞写
+        kwargs.update(
+            connect_args={"check_same_thread": False},
+            pool_size=db_config.get('pool_size', 10),
+            max_overflow=db_config.get('max_overflow', 20),
+            pool_timeout=db_config.get('pool_timeout', 30),
+        )
+        return f"{driver}:///{db_config.get('path', 'be.db')}", kwargs, True
+    if backend == 'memory':
+        # 内存 SQLite：共享缓存的命名内存库，连接池只有一个连接，所有事务串行执行
+        kwargs.update(
+            connect_args={"check_same_thread": False},
+            poolclass=AsyncAdaptedQueuePool if use_async else QueuePool,
+            pool_size=1,
+            max_overflow=0,
+            pool_timeout=db_config.get('pool_timeout', 60),
+        )
+        return f"{driver}:///{db_config['uri']}&uri=true", kwargs, False
+    raise ValueError("unknown database backend {}".format(backend))
+
+
+# 内存库在最后一个连接关闭时释放，keeper 连接保证库在进程存活期间一直存在。
+# 库名按进程区分，同一进程中的同步和异步引擎（如 ASGI 服务器与压测的一致性校验）访问的是同一个库
+def memory_keeper(db_config):
+    if db_config.get('backend') != 'memory':
+        return db_config, None
+    uri = f"file:be_{os.getpid()}?mode=memory&cache=shared"
+    keeper = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    return dict(db_config, uri=uri), keeper
 
+
+class StoreORM:
+    def __init__(self, db_config):
+        db_config, self.keeper = memory_keeper(db_config)
+        url, kwargs, wal = engine_args(db_config)
+        self.engine = create_engine(url, **kwargs)
+        if wal is not None:
+            _tune_sqlite(self.engine, wal)
+
+        # 统计每个请求和模型方法执行的 SQL 语句条数与耗时
+        metrics.instrument_engine(self.engine)
+        metrics.set_info(backend=db_config.get('backend', 'mysql'))
         self.init_tables()
+        # 线程内共享的会话：同一请求中的各个模型对象共用一个会话，请求结束时归还
+        self.Session = scoped_session(sessionmaker(bind=self.engine))
 
     def init_tables(self):
         try:
@@ -69,9 +195,37 @@ class StoreORM:
             logging.error(e)
 
     def get_db_conn(self):
-        DbSession = sessionmaker(bind=self.engine)
-        self.session = DbSession()
-        return self.session
+        return self.Session()
+
+    def remove_db_conn(self):
+        self.Session.remove()
+
+
+# 异步模式的数据库：异步引擎和 AsyncSession，模型代码通过 AsyncSession.run_sync 复用
+class AsyncStoreORM:
+    def __init__(self, db_config):
+        db_config, self.keeper = memory_keeper(db_config)
+        url, kwargs, wal = engine_args(db_config, use_async=True)
+        self.engine = create_async_engine(url, **kwargs)
+        if wal is not None:
+            _tune_sqlite(self.engine.sync_engine, wal)
+
+        metrics.instrument_engine(self.engine.sync_engine)
+        metrics.set_info(backend=db_config.get('backend', 'mysql'))
+        self.Session = async_sessionmaker(self.engine)
+
+    async def init_tables(self):
+        try:
+            async with self.engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+
+        except Exception as e:
+            logging.error(e)
+
+    # 在新的 AsyncSession 中执行同步的模型代码 func(session)
+    async def run_sync(self, func):
+        async with self.Session() as session:
+            return await session.run_sync(func)
 
 
 database_instance: StoreORM = None
@@ -85,3 +239,10 @@ def init_database(db_config):
 def get_db_conn():
     global database_instance
     return database_instance.get_db_conn()
+
+
+# 关闭当前线程的会话并把连接归还连接池，在请求结束时调用
+def remove_db_conn():
+    global database_instance
+    if database_instance is not None:
+        database_instance.remove_db_conn()
@@ -0,0 +1,103 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+# 已验证 token 的 LRU + TTL 缓存：命中时无需查询数据库即可完成鉴权
+# login / logout / change_password / unregister 会使该用户缓存的 token 失效。
+# 缓存在每个进程内；多进程部署时由主进程在 fork 之前调用 share 传入共享内存中的失效计数，
+# 任一进程吊销 token 时计数加一，其他进程下次查缓存时发现计数变化即清空本进程的缓存。ttl <= 0 表示关闭缓存
+class TokenCache:
+    def __init__(self, capacity: int = 100000, ttl: float = 300):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.enabled = ttl > 0
+        self.entries = OrderedDict()  # token -> (user_id, expire_at)
+        self.user_tokens = {}  # user_id -> set(token)
+        self.version = 0  # 每次失效加一，防止失效前开始的校验把旧 token 写回缓存
+        self.lock = threading.Lock()
+        self.shared_generation = None  # 进程间共享的失效计数（multiprocessing.Value）
+        self.generation = 0  # 本进程最后一次看到的共享计数
+
+    # 多进程部署时在 fork 之前调用，各工作进程继承同一个共享计数
+    def share(self, shared_generation):
+        self.shared_generation = shared_generation
+        self.generation = shared_generation.value
+
+    # 其他进程吊销过 token 时清空本进程的缓存，返回当前版本；调用方需持有 self.lock
+    def sync(self) -> int:
+        if self.shared_generation is not None:
+            generation = self.shared_generation.value
+            if generation != self.generation:
+                self.generation = generation
+                self.version += 1
+                self.entries.clear()
+                self.user_tokens.clear()
+        return self.version
+
+    # 开始校验 token 前取得的版本，put 时版本已变则不写入缓存
+    def current_version(self) -> int:
+        with self.lock:
+            return self.sync()
+
+    # 吊销后通知其他进程；调用方需持有 self.lock
+    def publish(self):
+        self.version += 1
+        if self.shared_generation is not None:
+            with self.shared_generation.get_lock():
+                self.shared_generation.value += 1
+                self.generation = self.shared_generation.value
+
+    def get(self, token: str):
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self.lock:
+            self.sync()
+            entry = self.entries.get(token)
+            if entry is None:
+                return None
+            user_id, expire_at = entry
+            if expire_at <= now:
+                self.remove(token)
+                return None
+            self.entries.move_to_end(token)
+            return user_id
+
+    def put(self, token: str, user_id: str, expire_at: float, version: int):
+        if not self.enabled:
+            return
+        expire_at = min(expire_at, time.time() + self.ttl)
+        with self.lock:
+            if version != self.sync():
+                return
+            self.remove(token)
+            self.entries[token] = (user_id, expire_at)
+            self.user_tokens.setdefault(user_id, set()).add(token)
+            while len(self.entries) > self.capacity:
+                oldest = next(iter(self.entries))
+                self.remove(oldest)
+
+    def invalidate_user(self, user_id: str):
+        with self.lock:
+            self.sync()
+            self.publish()
+            for token in self.user_tokens.pop(user_id, ()):
+                self.entries.pop(token, None)
+
+    def clear(self):
+        with self.lock:
+            self.publish()
+            self.entries.clear()
+            self.user_tokens.clear()
+
+    # 调用方需持有 self.lock
+    def remove(self, token: str):
+        entry = self.entries.pop(token, None)
+        if entry is None:
+            return
+        tokens = self.user_tokens.get(entry[0])
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self.user_tokens[entry[0]]
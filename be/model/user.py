@@ -1,10 +1,16 @@
 from sqlalchemy.orm.exc import NoResultFound
 from be.model import error
+from be.model import metrics
 from be.model.db_conn import DBConn
 import jwt
+import json
+import os
 import time
 import logging
 from be.model import store
+from be.model import search
+from be.model.token_cache import TokenCache
+from sqlalchemy import and_, func
 
 
 # encode a json string like:
@@ -33,11 +39,67 @@ def jwt_decode(encoded_token, user_id: str) -> str:
     return decoded
 
 
+# BE_TOKEN_CACHE_TTL 为缓存的有效期（秒），0 表示关闭缓存
+token_cache = TokenCache(ttl=float(os.environ.get("BE_TOKEN_CACHE_TTL", 300)))
+
+
+# 由图书目录和商铺库存拼出返回给客户端的书本信息
+def book_info(book: store.Book, store_book: store.Store) -> dict:
+    return {
+        "id": book.book_id,
+        "title": book.title,
+        "author": book.author,
+        "publisher": book.publisher,
+        "original_title": book.original_title,
+        "translator": book.translator,
+        "pub_year": book.pub_year,
+        "pages": book.pages,
+        "price": store_book.price if store_book.price is not None else book.price,
+        "currency_unit": book.currency_unit,
+        "binding": book.binding,
+        "isbn": book.isbn,
+        "author_intro": book.author_intro,
+        "book_intro": book.book_intro,
+        "content": book.content,
+        "tags": json.loads(book.tags) if book.tags else [],
+        "pictures": json.loads(book.pictures) if book.pictures else [],
+    }
+
+
+# 校验请求携带的 token，返回 (code, message, user_id)
+# 先查已验证 token 的缓存，未命中时才查询数据库
+def verify_token(token: str, session=None) -> (int, str, str):
+    if not token:
+        return error.error_authorization_fail() + ("",)
+    user_id = token_cache.get(token)
+    if user_id is not None:
+        return 200, "ok", user_id
+
+    try:
+        jwt_text = jwt.decode(token, options={"verify_signature": False})
+    except jwt.exceptions.PyJWTError:
+        return error.error_authorization_fail() + ("",)
+    user_id = jwt_text.get("user_id")
+    ts = jwt_text.get("timestamp")
+    if not isinstance(user_id, str) or not isinstance(ts, (int, float)):
+        return error.error_authorization_fail() + ("",)
+
+    version = token_cache.current_version()
+    u = User(session)
+    code, message = u.check_token(user_id, token)
+    # 只读查询，结束这个事务：同一会话中接下来的写方法要以 BEGIN IMMEDIATE 开始新事务
+    u.session.rollback()
+    if code != 200:
+        return code, message, ""
+    token_cache.put(token, user_id, ts + User.token_lifetime, version)
+    return 200, "ok", user_id
+
+
 class User(DBConn):
     token_lifetime: int = 3600  # 3600 seconds
 
-    def __init__(self):
-        DBConn.__init__(self)
+    def __init__(self, session=None):
+        DBConn.__init__(self, session)
 
     def __check_token(self, user_id, db_token, token) -> bool:
         try:
@@ -49,12 +111,14 @@ class User(DBConn):
                 now = time.time()
                 if self.token_lifetime > now - ts >= 0:
                     return True
-        except jwt.exceptions.InvalidSignatureError as e:
+        except jwt.exceptions.PyJWTError as e:
             logging.error(str(e))
             return False
 
+    @metrics.instrumented
     def register(self, user_id: str, password: str):
         try:
+            self.begin_write()
             if self.user_id_exist(user_id):
                 return error.error_exist_user_id(user_id)
             terminal = "terminal_{}".format(str(time.time()))
@@ -74,6 +138,7 @@ class User(DBConn):
             return 530, "{}".format(str(e))
         return 200, "ok"
 
+    @metrics.instrumented
     def check_token(self, user_id: str, token: str) -> (int, str):
         try:
             user = self.session.query(store.User).filter_by(user_id=user_id).one()
@@ -84,6 +149,7 @@ class User(DBConn):
         except NoResultFound:
             return error.error_authorization_fail()
 
+    @metrics.instrumented
     def check_password(self, user_id: str, password: str) -> (int, str):
         try:
             user = self.session.query(store.User).filter_by(user_id=user_id).one()
@@ -94,9 +160,11 @@ class User(DBConn):
         except NoResultFound:
             return error.error_authorization_fail()
 
+    @metrics.instrumented
     def login(self, user_id: str, password: str, terminal: str) -> (int, str, str):
         token = ""
         try:
+            self.begin_write()
             code, message = self.check_password(user_id, password)
             if code != 200:
                 return code, message, ""
@@ -110,14 +178,17 @@ class User(DBConn):
                 {"token": token,"terminal":terminal})
 
             self.session.commit()
+            token_cache.invalidate_user(user_id)
         except NoResultFound:
             return error.error_authorization_fail() + ("",)
         except Exception as e:
             return 530, "{}".format(str(e)), ""
         return 200, "ok", token
 
+    @metrics.instrumented
     def logout(self, user_id: str, token: str) -> bool:
         try:
+            self.begin_write()
             code, message = self.check_token(user_id, token)
             if code != 200:
                 return code, message
@@ -133,20 +204,24 @@ class User(DBConn):
                 {"token": dummy_token,"terminal":terminal})
 
             self.session.commit()
+            token_cache.invalidate_user(user_id)
         except NoResultFound:
             return error.error_authorization_fail()
         except Exception as e:
             return 530, "{}".format(str(e))
         return 200, "ok"
 
+    @metrics.instrumented
     def unregister(self, user_id: str, password: str) -> (int, str):
         try:
+            self.begin_write()
             code, message = self.check_password(user_id, password)
             if code != 200:
                 return code, message
 
             self.session.query(store.User).filter_by(user_id=user_id).delete()
             self.session.commit()
+            token_cache.invalidate_user(user_id)
 
             return 200, "ok"
         except NoResultFound:
@@ -155,8 +230,10 @@ class User(DBConn):
             return 530, "{}".format(str(e))
         return error.error_authorization_fail()
 
+    @metrics.instrumented
     def change_password(self, user_id: str, old_password: str, new_password: str) -> bool:
         try:
+            self.begin_write()
             code, message = self.check_password(user_id, old_password)
             if code != 200:
                 return code, message
@@ -168,53 +245,69 @@ class User(DBConn):
                 {"password":new_password,"token": token,"terminal":terminal})
 
             self.session.commit()
+            token_cache.invalidate_user(user_id)
         except NoResultFound:
             return error.error_authorization_fail()
         except Exception as e:
             return 530, "{}".format(str(e))
         return 200, "ok"
 
-    def search_books(self, query: str, search_scope: str, store_id=None):
+    # 基于倒排索引的检索：查询词分词后在 book_token 表中按 (field, token) 查找，
+    # 要求命中全部查询词，不再对书本信息做全表扫描
+    @metrics.instrumented
+    def search_books(self, query: str, search_scope: str, store_id=None, page: int = 1):
         try:
-            search_scope_mapping = {
-                "title": "book_info",
-                "tag": "book_info",
-                "content": "book_info",
-                "book_intro": "book_info"
-            }
-            page = 1
             page_size = 10
-            search_filter = {}
+            # page 来自请求体，可能不是整数（bool 也是 int 的子类，一并排除）
+            if page is not None and (not isinstance(page, int) or isinstance(page, bool)):
+                return error.error_invalid_parameter("page") + (None,)
+            if not page or page < 1:
+                page = 1
+
+            if search_scope not in search.SEARCH_FIELDS:
+                return error.error_and_message(400, "Invalid search scope") + (None,)
 
             if store_id:
                 if not self.store_id_exist(store_id):
-                    return error.error_non_exist_store_id(store_id)
-                search_filter["store_id"] = store_id
-
-            if search_scope in search_scope_mapping:
-                field_name = search_scope_mapping[search_scope]
-
-                # 使用类似 SQLAlchemy ORM 的方式进行查询
-                query = (
-                    self.session.query(store.Store)
-                    .filter(getattr(store.Store, field_name).ilike(f"%{query}%"))
-                    .limit(page_size)
-                    .offset((page - 1) * page_size)
-                )
-
-                books = [
-                    {
-                        "store_id": book.store_id,
-                        "book_id": book.book_id,
-                        "book_info": book.book_info,
-                        "stock_level": book.stock_level
-                    }
-                    for book in query
-                ]
-
-                return 200, "Search successful", books
-            else:
-                return error.error_and_message(400, "Invalid search scope"), None
-        except Exception as e:
-            return error.error_and_message(500, f"Error: {str(e)}"), None
+                    return error.error_non_exist_store_id(store_id) + (None,)
+
+            tokens = search.tokenize(query)
+            if not tokens:
+                return 200, "Search successful", []
+
+            hits = (
+                self.session.query(store.Store.store_id, store.Store.book_id)
+                .join(store.BookToken, store.BookToken.book_id == store.Store.book_id)
+                .filter(store.BookToken.field == search_scope, store.BookToken.token.in_(tokens))
+            )
+            if store_id:
+                hits = hits.filter(store.Store.store_id == store_id)
+            hits = (
+                hits.group_by(store.Store.store_id, store.Store.book_id)
+                .having(func.count(store.BookToken.token) == len(tokens))
+                .order_by(store.Store.store_id, store.Store.book_id)
+                .limit(page_size)
+                .offset((page - 1) * page_size)
+                .subquery()
+            )
 
+            rows = (
+                self.session.query(store.Store, store.Book)
+                .join(hits, and_(store.Store.store_id == hits.c.store_id, store.Store.book_id == hits.c.book_id))
+                .join(store.Book, store.Book.book_id == store.Store.book_id)
+                .order_by(store.Store.store_id, store.Store.book_id)
+            )
+
+            books = [
+                {
+                    "store_id": store_book.store_id,
+                    "book_id": store_book.book_id,
+                    "book_info": book_info(book, store_book),
+                    "stock_level": store_book.stock_level
+                }
+                for store_book, book in rows
+            ]
+
+            return 200, "Search successful", books
+        except Exception as e:
+            return error.error_and_message(500, f"Error: {str(e)}") + (None,)
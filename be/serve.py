@@ -1,42 +1,60 @@
 import logging
 import os
+import threading
 from flask import Flask
 from flask import Blueprint
-from flask import request
+from werkzeug.serving import make_server, WSGIRequestHandler
+from werkzeug.wsgi import LimitedStream
 from be.view import auth
 from be.view import seller
 from be.view import buyer
-from be.model.store import init_database
+from be.view import metrics
+from be.model import metrics as model_metrics
+from be.model.store import init_database, remove_db_conn
+from be.model.order_reaper import OrderReaper
 
 bp_shutdown = Blueprint("shutdown", __name__)
 
+order_reaper: OrderReaper = None
+server = None
 
-def shutdown_server():
-    func = request.environ.get("werkzeug.server.shutdown")
-    if func is None:
-        raise RuntimeError("Not running with the Werkzeug Server")
-    func()
+parent_path = os.path.dirname(os.path.dirname(__file__))
+
+
+# 请求结束时关闭本线程的数据库会话，把连接归还连接池
+def close_db_session(exception):
+    remove_db_conn()
 
 
 @bp_shutdown.route("/shutdown")
 def be_shutdown():
-    shutdown_server()
+    if order_reaper is not None:
+        order_reaper.stop()
+    # shutdown 会等待 serve_forever 退出，放到单独的线程里，先把响应返回
+    if server is not None:
+        threading.Thread(target=server.shutdown).start()
     return "Server shutting down..."
 
 
-def be_run():
-    this_path = os.path.dirname(__file__)
-    parent_path = os.path.dirname(this_path)
-    log_file = os.path.join(parent_path, "app.log")
-
-    init_database({
+# 从环境变量读取数据库配置
+# BE_DB_BACKEND 选择存储后端：mysql（默认）、sqlite（BE_DB_PATH 指定文件）、memory
+def db_config() -> dict:
+    return {
+        'backend': os.environ.get('BE_DB_BACKEND', 'mysql'),
+        'path': os.environ.get('BE_DB_PATH', os.path.join(parent_path, 'be.db')),
         'host': 'localhost',
         'user': 'root',
         'password': 'hbb2003',
-        'database': 'be'
-    })
+        'database': 'be',
+        'pool_size': int(os.environ.get('BE_DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('BE_DB_MAX_OVERFLOW', 20)),
+        'pool_recycle': int(os.environ.get('BE_DB_POOL_RECYCLE', 3600)),
+        'echo': os.environ.get('BE_SQL_ECHO', '') == '1',
+    }
 
 
+def init_logging():
+    log_file = os.path.join(parent_path, "app.log")
     logging.basicConfig(filename=log_file, level=logging.ERROR)
     handler = logging.StreamHandler()
     formatter = logging.Formatter(
@@ -45,9 +63,54 @@ def be_run():
     handler.setFormatter(formatter)
     logging.getLogger().addHandler(handler)
 
+
+# 初始化数据库连接池并启动超时订单清理线程；多进程部署时每个工作进程在 fork 之后各调用一次
+def init_backend():
+    global order_reaper
+    init_database(db_config())
+    order_reaper = OrderReaper()
+    order_reaper.start()
+
+
+def create_app() -> Flask:
     app = Flask(__name__)
-    app.register_blueprint(bp_shutdown)
+    app.teardown_appcontext(close_db_session)
     app.register_blueprint(auth.bp_auth)
     app.register_blueprint(seller.bp_seller)
     app.register_blueprint(buyer.bp_buyer)
-    app.run()
+    app.register_blueprint(metrics.bp_metrics)
+    return app
+
+
+# werkzeug 默认使用 HTTP/1.0，每个请求之后关闭连接；改为 HTTP/1.1 让客户端复用长连接。
+# 长连接上请求体没有读完（例如鉴权失败直接返回）时，要把剩余部分读掉，否则会被当成下一个请求；
+# 响应头和响应体分开写出，关闭 Nagle 算法以免与延迟确认叠加，每个请求多等 40ms
+class KeepAliveRequestHandler(WSGIRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def make_environ(self):
+        environ = WSGIRequestHandler.make_environ(self)
+        if not environ.get("wsgi.input_terminated"):
+            content_length = int(environ.get("CONTENT_LENGTH") or 0)
+            environ["wsgi.input"] = LimitedStream(environ["wsgi.input"], content_length)
+        return environ
+
+    def run_wsgi(self):
+        WSGIRequestHandler.run_wsgi(self)
+        stream = self.environ["wsgi.input"]
+        if isinstance(stream, LimitedStream):
+            stream.exhaust()
+
+
+# 单进程多线程的测试服务器，/shutdown 可以停止它；生产部署使用 be.wsgi
+def be_run(host: str = "127.0.0.1", port: int = 5000):
+    global server
+    model_metrics.set_info(server="werkzeug")
+    init_backend()
+    init_logging()
+
+    app = create_app()
+    app.register_blueprint(bp_shutdown)
+    server = make_server(host, port, app, threaded=True, request_handler=KeepAliveRequestHandler)
+    server.serve_forever()
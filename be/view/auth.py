@@ -2,10 +2,27 @@ from flask import Blueprint
 from flask import request
 from flask import jsonify
 from be.model import user
+from be.model import error
 
 bp_auth = Blueprint("auth", __name__, url_prefix="/auth")
 
 
+# 买家、卖家蓝图的请求级鉴权：校验 header 中的 token，
+# 并要求请求体中的 user_id（如有）与 token 所属用户一致。
+# 先读完请求体再鉴权：gunicorn 不会读掉被拒绝请求剩余的请求体，长连接上的下一个请求会因此卡住
+def login_required():
+    body = request.get_json(silent=True) or {}
+    token = request.headers.get("token", "")
+    code, message, token_user_id = user.verify_token(token)
+    if code != 200:
+        return jsonify({"message": message}), code
+
+    user_id = body.get("user_id")
+    if user_id is not None and user_id != token_user_id:
+        code, message = error.error_authorization_fail()
+        return jsonify({"message": message}), code
+
+
 @bp_auth.route("/login", methods=["POST"])
 def login():
     user_id = request.json.get("user_id", "")
@@ -62,8 +79,9 @@ def search_books():
     query = request.json.get("query")
     search_scope = request.json.get("search_scope")
     store_id = request.json.get("store_id")  # Add store_id parameter
+    page = request.json.get("page", 1)
     u = user.User()
 
-    code, message, books = u.search_books(query=query, search_scope=search_scope, store_id=store_id)
+    code, message, books = u.search_books(query=query, search_scope=search_scope, store_id=store_id, page=page)
 
     return jsonify({"message": message, "books": books}), code
@@ -2,8 +2,10 @@ from flask import Blueprint
 from flask import request
 from flask import jsonify
 from be.model.buyer import Buyer
+from be.view.auth import login_required
 
 bp_buyer = Blueprint("buyer", __name__, url_prefix="/buyer")
+bp_buyer.before_request(login_required)
 
 
 @bp_buyer.route("/new_order", methods=["POST"])
@@ -22,6 +24,22 @@ def new_order():
     return jsonify({"message": message, "order_id": order_id}), code
 
 
+@bp_buyer.route("/new_orders", methods=["POST"])
+def new_orders():
+    user_id: str = request.json.get("user_id")
+    orders: [] = request.json.get("orders")
+    store_id_and_books = []
+    for order in orders:
+        id_and_count = []
+        for book in order.get("books"):
+            id_and_count.append((book.get("id"), book.get("count")))
+        store_id_and_books.append((order.get("store_id"), id_and_count))
+
+    b = Buyer()
+    code, message, results = b.new_orders(user_id, store_id_and_books)
+    return jsonify({"message": message, "orders": results}), code
+
+
 @bp_buyer.route("/payment", methods=["POST"])
 def payment():
     user_id: str = request.json.get("user_id")
@@ -63,9 +81,11 @@ def buyer_order_cancel():
 @bp_buyer.route("/history_order", methods=["POST"])
 def history_order():
     user_id = request.json.get("user_id")
+    cursor = request.json.get("cursor")
+    page_size = request.json.get("page_size")
     b = Buyer()
-    code, message, order = b.history_order(user_id)
-    return jsonify({"message": message}), code
+    code, message, orders, next_cursor = b.history_order(user_id, cursor, page_size)
+    return jsonify({"message": message, "orders": orders, "next_cursor": next_cursor}), code
 
 
 @bp_buyer.route("/overtime_order_cancel", methods=["POST"])
@@ -0,0 +1,30 @@
+from flask import Blueprint
+from flask import Response
+from flask import g
+from flask import request
+from be.model import metrics
+
+bp_metrics = Blueprint("metrics", __name__)
+
+
+@bp_metrics.before_app_request
+def begin_request_metrics():
+    g.metrics_scope = metrics.begin_scope()
+
+
+@bp_metrics.teardown_app_request
+def end_request_metrics(exception):
+    scope = g.pop("metrics_scope", None)
+    if scope is None:
+        return
+    metrics.end_scope(scope)
+    if request.url_rule is not None:
+        route = request.url_rule.rule
+    else:
+        route = "unmatched"
+    metrics.observe_request(route, scope)
+
+
+@bp_metrics.route("/metrics")
+def get_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
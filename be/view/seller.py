@@ -2,9 +2,11 @@ from flask import Blueprint
 from flask import request
 from flask import jsonify
 from be.model import seller
+from be.view.auth import login_required
 import json
 
 bp_seller = Blueprint("seller", __name__, url_prefix="/seller")
+bp_seller.before_request(login_required)
 
 
 @bp_seller.route("/create_store", methods=["POST"])
@@ -31,6 +33,25 @@ def seller_add_book():
     return jsonify({"message": message}), code
 
 
+@bp_seller.route("/add_books", methods=["POST"])
+def seller_add_books():
+    user_id: str = request.json.get("user_id")
+    store_id: str = request.json.get("store_id")
+    books: [] = request.json.get("books")
+
+    id_info_and_stock = []
+    for book in books:
+        book_info = book.get("book_info")
+        id_info_and_stock.append(
+            (book_info.get("id"), json.dumps(book_info), book.get("stock_level", 0))
+        )
+
+    s = seller.Seller()
+    code, message = s.add_books(user_id, store_id, id_info_and_stock)
+
+    return jsonify({"message": message}), code
+
+
 @bp_seller.route("/add_stock_level", methods=["POST"])
 def add_stock_level():
     user_id: str = request.json.get("user_id")
@@ -0,0 +1,83 @@
+import multiprocessing
+import os
+
+from gunicorn.app.base import BaseApplication
+
+from be import serve
+from be.model import metrics
+from be.model import search
+from be.model import user
+
+
+# 生产部署入口：gunicorn 多进程（每个进程多线程）运行，用法 python -m be.wsgi
+# 收到 SIGTERM 时 gunicorn 停止接受新连接，等待处理中的请求完成（最长 BE_GRACEFUL_TIMEOUT 秒）再退出。
+#
+# 以下状态在每个工作进程内各有一份，进程之间不共享：
+# - 数据库连接池和超时订单清理线程（post_fork 中建立）
+# - 已验证 token 的缓存（user.token_cache）：各进程各自缓存，吊销通过主进程创建的共享失效计数
+#   通知所有工作进程，被吊销的 token 在任何进程中都立即失效
+# - 分词进程池（search）：多于一个工作进程时缩小池的大小，小批量直接在工作进程内分词，worker_exit 时关闭
+# - /metrics 的统计：返回的是处理该请求的进程的指标
+# - 内存数据库（BE_DB_BACKEND=memory）：因此只启动一个工作进程
+class BookstoreApplication(BaseApplication):
+    def __init__(self, options: dict = None):
+        self.options = options or {}
+        BaseApplication.__init__(self)
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key, value)
+
+    def load(self):
+        return serve.create_app()
+
+
+# 数据库连接池不能跨 fork 共享，每个工作进程 fork 之后各自建立连接池和清理线程；
+# 清理线程使用 SKIP LOCKED 分批取消，多个进程同时运行不会重复取消。
+# 多进程时分词进程池按进程数分摊 CPU
+def post_fork(server, worker):
+    workers = server.cfg.workers
+    if workers > 1:
+        search.configure(
+            size=min(search.pool_size, max(1, multiprocessing.cpu_count() // workers)),
+            threshold=max(search.parallel_threshold, search.MULTI_WORKER_PARALLEL_THRESHOLD),
+        )
+    metrics.set_info(server="gunicorn")
+    serve.init_backend()
+
+
+def worker_exit(server, worker):
+    if serve.order_reaper is not None:
+        serve.order_reaper.stop()
+    search.shutdown_pool()
+
+
+def options_from_env() -> dict:
+    workers = int(os.environ.get('BE_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+    # 内存数据库只存在于单个进程中，多个工作进程会各自拥有一份互不相通的数据
+    if os.environ.get('BE_DB_BACKEND') == 'memory':
+        workers = 1
+    return {
+        'bind': os.environ.get('BE_BIND', '127.0.0.1:5000'),
+        'workers': workers,
+        'worker_class': 'gthread',
+        'threads': int(os.environ.get('BE_THREADS', 4)),
+        'keepalive': int(os.environ.get('BE_KEEPALIVE', 5)),
+        'backlog': int(os.environ.get('BE_BACKLOG', 2048)),
+        'timeout': int(os.environ.get('BE_TIMEOUT', 30)),
+        'graceful_timeout': int(os.environ.get('BE_GRACEFUL_TIMEOUT', 30)),
+        'post_fork': post_fork,
+        'worker_exit': worker_exit,
+    }
+
+
+# 在主进程中创建 token 缓存的共享失效计数，fork 出的工作进程都继承它
+def wsgi_run():
+    serve.init_logging()
+    user.token_cache.share(multiprocessing.Value("q", 0))
+    BookstoreApplication(options_from_env()).run()
+
+
+if __name__ == "__main__":
+    wsgi_run()
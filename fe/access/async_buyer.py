@@ -0,0 +1,41 @@
+import aiohttp
+from urllib.parse import urljoin
+
+
+# 异步买家客户端，供 fe/bench 的 asyncio 压测使用；多个买家共享同一个 aiohttp.ClientSession 的连接池
+class AsyncBuyer:
+    def __init__(self, url_prefix, user_id, password, session: aiohttp.ClientSession):
+        self.auth_prefix = urljoin(url_prefix, "auth/")
+        self.url_prefix = urljoin(url_prefix, "buyer/")
+        self.user_id = user_id
+        self.password = password
+        self.token = ""
+        self.terminal = "my terminal"
+        self.session = session
+
+    async def post(self, url: str, json: dict) -> (int, dict):
+        headers = {"token": self.token}
+        async with self.session.post(url, headers=headers, json=json) as r:
+            response_json = await r.json(content_type=None)
+            return r.status, response_json or {}
+
+    async def login(self) -> int:
+        json = {"user_id": self.user_id, "password": self.password, "terminal": self.terminal}
+        code, response_json = await self.post(urljoin(self.auth_prefix, "login"), json)
+        self.token = response_json.get("token")
+        return code
+
+    async def new_order(self, store_id: str, book_id_and_count: [(str, int)]) -> (int, str):
+        books = [{"id": book_id, "count": count} for book_id, count in book_id_and_count]
+        json = {"user_id": self.user_id, "store_id": store_id, "books": books}
+        code, response_json = await self.post(urljoin(self.url_prefix, "new_order"), json)
+        return code, response_json.get("order_id")
+
+    async def payment(self, order_id: str) -> int:
+        json = {
+            "user_id": self.user_id,
+            "password": self.password,
+            "order_id": order_id,
+        }
+        code, _ = await self.post(urljoin(self.url_prefix, "payment"), json)
+        return code
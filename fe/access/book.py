@@ -29,6 +29,15 @@ class Book:
 
 
 class BookDB:
+    columns = (
+        "id, title, author, "
+        "publisher, original_title, "
+        "translator, pub_year, pages, "
+        "price, currency_unit, binding, "
+        "isbn, author_intro, book_intro, "
+        "content, tags"
+    )
+
     def __init__(self, large: bool = False):
         parent_path = os.path.dirname(os.path.dirname(__file__))
         self.db_s = os.path.join(parent_path, "data/book.db")
@@ -37,62 +46,82 @@ class BookDB:
             self.book_db = self.db_l
         else:
             self.book_db = self.db_s
+        self.conn = None
+
+    # 只读方式打开的持久连接，所有查询共用
+    def connect(self) -> sqlite.Connection:
+        if self.conn is None:
+            self.conn = sqlite.connect(
+                "file:{}?mode=ro".format(self.book_db), uri=True, check_same_thread=False
+            )
+        return self.conn
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
 
     def get_book_count(self):
-        conn = sqlite.connect(self.book_db)
-        cursor = conn.execute("SELECT count(id) FROM book")
+        cursor = self.connect().execute("SELECT count(id) FROM book")
         row = cursor.fetchone()
         return row[0]
 
     def get_book_info(self, start, size) -> [Book]:
-        books = []
-        conn = sqlite.connect(self.book_db)
-        cursor = conn.execute(
-            "SELECT id, title, author, "
-            "publisher, original_title, "
-            "translator, pub_year, pages, "
-            "price, currency_unit, binding, "
-            "isbn, author_intro, book_intro, "
-            "content, tags, picture FROM book ORDER BY id "
+        cursor = self.connect().execute(
+            "SELECT " + self.columns + ", picture IS NOT NULL FROM book ORDER BY id "
             "LIMIT ? OFFSET ?",
             (size, start),
         )
+        books = []
         for row in cursor:
-            book = Book()
-            book.id = row[0]
-            book.title = row[1]
-            book.author = row[2]
-            book.publisher = row[3]
-            book.original_title = row[4]
-            book.translator = row[5]
-            book.pub_year = row[6]
-            book.pages = row[7]
-            book.price = row[8]
+            book = self.to_book(row)
+            # 图片只用占位字符串，不读取也不编码图片内容
+            if row[16]:
+                book.pictures = ["pictures"] * random.randint(0, 9)
+            books.append(book)
+        return books
 
-            book.currency_unit = row[9]
-            book.binding = row[10]
-            book.isbn = row[11]
-            book.author_intro = row[12]
-            book.book_intro = row[13]
-            book.content = row[14]
-            tags = row[15]
+    # 按 id 顺序逐本读取全部书籍：每次取 batch_size 行，用 id > 上一批最后一个 id 做键集分页，
+    # 整个扫描是线性的；load_pictures 为真时才读取图片并做一次 base64 编码
+    def iter_books(self, batch_size: int = 100, load_pictures: bool = False):
+        columns = self.columns + (", picture" if load_pictures else "")
+        first_sql = "SELECT " + columns + " FROM book ORDER BY id LIMIT ?"
+        next_sql = "SELECT " + columns + " FROM book WHERE id > ? ORDER BY id LIMIT ?"
+        conn = self.connect()
+        rows = conn.execute(first_sql, (batch_size,)).fetchall()
+        while True:
+            for row in rows:
+                book = self.to_book(row)
+                if load_pictures and row[16] is not None:
+                    book.pictures.append(base64.b64encode(row[16]).decode("utf-8"))
+                yield book
+            if len(rows) < batch_size:
+                return
+            rows = conn.execute(next_sql, (rows[-1][0], batch_size)).fetchall()
 
-            picture = row[16]
+    @staticmethod
+    def to_book(row) -> Book:
+        book = Book()
+        book.id = row[0]
+        book.title = row[1]
+        book.author = row[2]
+        book.publisher = row[3]
+        book.original_title = row[4]
+        book.translator = row[5]
+        book.pub_year = row[6]
+        book.pages = row[7]
+        book.price = row[8]
 
+        book.currency_unit = row[9]
+        book.binding = row[10]
+        book.isbn = row[11]
+        book.author_intro = row[12]
+        book.book_intro = row[13]
+        book.content = row[14]
+        tags = row[15]
+
+        if tags:
             for tag in tags.split("\n"):
                 if tag.strip() != "":
                     book.tags.append(tag)
-            for i in range(0, random.randint(0, 9)):
-                if picture is not None:
-                    encode_str = base64.b64encode(picture).decode("utf-8")
-                    # book.pictures.append(encode_str)
-                    book.pictures.append("pictures")
-
-            books.append(book)
-            # print(tags.decode('utf-8'))
-
-            # print(book.tags, len(book.picture))
-            # print(book)
-            # print(tags)
-
-        return books
+        return book
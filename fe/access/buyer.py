@@ -1,17 +1,19 @@
 import requests
 import simplejson
 from urllib.parse import urljoin
+from fe.access import http
 from fe.access.auth import Auth
 
 
 class Buyer:
-    def __init__(self, url_prefix, user_id, password):
+    def __init__(self, url_prefix, user_id, password, session: requests.Session = None):
         self.url_prefix = urljoin(url_prefix, "buyer/")
+        self.session = session or http.get_session()
         self.user_id = user_id
         self.password = password
         self.token = ""
         self.terminal = "my terminal"
-        self.auth = Auth(url_prefix)
+        self.auth = Auth(url_prefix, self.session)
         code, self.token = self.auth.login(self.user_id, self.password, self.terminal)
         assert code == 200
 
@@ -23,10 +25,24 @@ class Buyer:
         # print(simplejson.dumps(json))
         url = urljoin(self.url_prefix, "new_order")
         headers = {"token": self.token}
-        r = requests.post(url, headers=headers, json=json)
+        r = self.session.post(url, headers=headers, json=json)
         response_json = r.json()
         return r.status_code, response_json.get("order_id")
 
+    def new_orders(self, store_id_and_books: [(str, [(str, int)])]) -> (int, [dict]):
+        orders = []
+        for store_id, book_id_and_count in store_id_and_books:
+            books = []
+            for id_count_pair in book_id_and_count:
+                books.append({"id": id_count_pair[0], "count": id_count_pair[1]})
+            orders.append({"store_id": store_id, "books": books})
+        json = {"user_id": self.user_id, "orders": orders}
+        url = urljoin(self.url_prefix, "new_orders")
+        headers = {"token": self.token}
+        r = self.session.post(url, headers=headers, json=json)
+        response_json = r.json()
+        return r.status_code, response_json.get("orders")
+
     def payment(self, order_id: str):
         json = {
             "user_id": self.user_id,
@@ -35,7 +51,7 @@ class Buyer:
         }
         url = urljoin(self.url_prefix, "payment")
         headers = {"token": self.token}
-        r = requests.post(url, headers=headers, json=json)
+        r = self.session.post(url, headers=headers, json=json)
         return r.status_code
 
     def add_funds(self, add_value: str) -> int:
@@ -46,7 +62,7 @@ class Buyer:
         }
         url = urljoin(self.url_prefix, "add_funds")
         headers = {"token": self.token}
-        r = requests.post(url, headers=headers, json=json)
+        r = self.session.post(url, headers=headers, json=json)
         return r.status_code
 
     def receive_order(self, user_id: str, order_id: str) -> int:
@@ -56,7 +72,7 @@ class Buyer:
         }
         url = urljoin(self.url_prefix, "receive_order")
         headers = {"token": self.token}
-        r = requests.post(url, headers=headers, json=json)
+        r = self.session.post(url, headers=headers, json=json)
         return r.status_code
 
     def buyer_order_cancel(self, user_id: str, order_id: str) -> int:
@@ -66,19 +82,25 @@ class Buyer:
         }
         url = urljoin(self.url_prefix, "buyer_order_cancel")
         headers = {"token": self.token}
-        r = requests.post(url, headers=headers, json=json)
+        r = self.session.post(url, headers=headers, json=json)
         return r.status_code
 
-    def history_order(self, user_id: str) -> int:
+    def history_order(self, user_id: str, cursor: str = None, page_size: int = None) -> (int, [dict], str):
         json = {
             "user_id": user_id,
         }
+        if cursor is not None:
+            json["cursor"] = cursor
+        if page_size is not None:
+            json["page_size"] = page_size
         url = urljoin(self.url_prefix, "history_order")
         headers = {"token": self.token}
-        r = requests.post(url, headers=headers, json=json)
-        return r.status_code
+        r = self.session.post(url, headers=headers, json=json)
+        response_json = r.json()
+        return r.status_code, response_json.get("orders"), response_json.get("next_cursor")
 
     def overtime_order_cancel(self) -> int:
         url = urljoin(self.url_prefix, "overtime_order_cancel")
-        r = requests.post(url)
+        headers = {"token": self.token}
+        r = self.session.post(url, headers=headers)
         return r.status_code
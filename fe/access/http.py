@@ -0,0 +1,30 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from fe import conf
+
+_session: requests.Session = None
+_lock = threading.Lock()
+
+
+# 新建一个带连接池的 HTTP 会话，同一主机的请求复用长连接
+def new_session(pool_connections: int = None, pool_maxsize: int = None) -> requests.Session:
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections or conf.Http_Pool_Connections,
+        pool_maxsize=pool_maxsize or conf.Http_Pool_Maxsize,
+        pool_block=conf.Http_Pool_Block,
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# Auth、Buyer、Seller 默认共享的 HTTP 会话
+def get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = new_session()
+    return _session
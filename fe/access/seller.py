@@ -1,16 +1,18 @@
 import requests
 from urllib.parse import urljoin
 from fe.access import book
+from fe.access import http
 from fe.access.auth import Auth
 
 
 class Seller:
-    def __init__(self, url_prefix, seller_id: str, password: str):
+    def __init__(self, url_prefix, seller_id: str, password: str, session: requests.Session = None):
         self.url_prefix = urljoin(url_prefix, "seller/")
+        self.session = session or http.get_session()
         self.seller_id = seller_id
         self.password = password
         self.terminal = "my terminal"
-        self.auth = Auth(url_prefix)
+        self.auth = Auth(url_prefix, self.session)
         code, self.token = self.auth.login(self.seller_id, self.password, self.terminal)
         assert code == 200
 
@@ -22,7 +24,7 @@ class Seller:
         # print(simplejson.dumps(json))
         url = urljoin(self.url_prefix, "create_store")
         headers = {"token": self.token}
-        r = requests.post(url, headers=headers, json=json)
+        r = self.session.post(url, headers=headers, json=json)
         return r.status_code
 
     def add_book(self, store_id: str, stock_level: int, book_info: book.Book) -> int:
@@ -35,7 +37,21 @@ class Seller:
         # print(simplejson.dumps(json))
         url = urljoin(self.url_prefix, "add_book")
         headers = {"token": self.token}
-        r = requests.post(url, headers=headers, json=json)
+        r = self.session.post(url, headers=headers, json=json)
+        return r.status_code
+
+    def add_books(self, store_id: str, stock_level_and_books: [(int, book.Book)]) -> int:
+        books = []
+        for stock_level, book_info in stock_level_and_books:
+            books.append({"book_info": book_info.__dict__, "stock_level": stock_level})
+        json = {
+            "user_id": self.seller_id,
+            "store_id": store_id,
+            "books": books,
+        }
+        url = urljoin(self.url_prefix, "add_books")
+        headers = {"token": self.token}
+        r = self.session.post(url, headers=headers, json=json)
         return r.status_code
 
     def add_stock_level(
@@ -50,7 +66,7 @@ class Seller:
         # print(simplejson.dumps(json))
         url = urljoin(self.url_prefix, "add_stock_level")
         headers = {"token": self.token}
-        r = requests.post(url, headers=headers, json=json)
+        r = self.session.post(url, headers=headers, json=json)
         return r.status_code
 
     def ship_order(
@@ -62,7 +78,7 @@ class Seller:
         }
         url = urljoin(self.url_prefix, "ship_order")
         headers = {"token": self.token}
-        r = requests.post(url, headers=headers, json=json)
+        r = self.session.post(url, headers=headers, json=json)
         return r.status_code
 
 
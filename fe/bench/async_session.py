@@ -0,0 +1,70 @@
+import asyncio
+import time
+import aiohttp
+from fe import conf
+from fe.access.async_buyer import AsyncBuyer
+from fe.bench.workload import Workload
+from fe.bench.workload import NewOrder
+from fe.bench.workload import Payment
+
+
+# asyncio 压测：单个进程中用协程模拟大量并发买家（虚拟用户），共享一个 aiohttp 连接池
+class AsyncSession:
+    def __init__(self, wl: Workload, virtual_users: int = None, request_per_user: int = None):
+        self.workload = wl
+        self.virtual_users = virtual_users or conf.Async_Virtual_Users
+        self.request_per_user = request_per_user or conf.Async_Request_Per_User
+        # 买家编号 -> 已登录的 AsyncBuyer；同一买家重新登录会使之前的 token 失效，所以每个买家只登录一次
+        self.buyers = {}
+
+    def run(self):
+        asyncio.run(self.run_async())
+
+    async def run_async(self):
+        connector = aiohttp.TCPConnector(limit=conf.Async_Max_Connections)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            await self.login_buyers(session)
+            await asyncio.gather(*[self.virtual_user() for _ in range(self.virtual_users)])
+
+    async def login_buyers(self, session: aiohttp.ClientSession):
+        for no in range(1, self.workload.buyer_num + 1):
+            buyer_id, password = self.workload.to_buyer_id_and_password(no)
+            self.buyers[no] = AsyncBuyer(conf.URL, buyer_id, password, session)
+        codes = await asyncio.gather(*[b.login() for b in self.buyers.values()])
+        assert all(code == 200 for code in codes)
+
+    # 一个虚拟用户：依次下单，下单成功后立即付款，结束时汇总一次统计
+    async def virtual_user(self):
+        n_new_order = n_payment = n_new_order_ok = n_payment_ok = 0
+        time_new_order = time_payment = 0
+        for _ in range(self.request_per_user):
+            buyer_no, store_id, book_id_and_count = self.workload.gen_new_order()
+            new_order = NewOrder(self.buyers[buyer_no], store_id, book_id_and_count)
+            before = time.time()
+            ok, order_id = await new_order.run_async()
+            after = time.time()
+            self.workload.record("new_order", before, after, new_order.code)
+            time_new_order = time_new_order + after - before
+            n_new_order = n_new_order + 1
+            if not ok:
+                continue
+            n_new_order_ok = n_new_order_ok + 1
+
+            payment = Payment(new_order.buyer, order_id)
+            before = time.time()
+            ok = await payment.run_async()
+            after = time.time()
+            self.workload.record("payment", before, after, payment.code)
+            time_payment = time_payment + after - before
+            n_payment = n_payment + 1
+            if ok:
+                n_payment_ok = n_payment_ok + 1
+
+        self.workload.update_stat(
+            n_new_order,
+            n_payment,
+            n_new_order_ok,
+            n_payment_ok,
+            time_new_order,
+            time_payment,
+        )
@@ -0,0 +1,175 @@
+import json
+import logging
+import os
+import re
+from fe import conf
+
+# 压测操作 -> 完成它的模型方法，每次操作的 SQL 语句数取自 /metrics 中该方法的 be_model_method_sql_statements
+OPERATION_METHODS = {
+    "new_order": "Buyer.new_order",
+    "payment": "Buyer.payment",
+    "search": "User.search_books",
+    "history_order": "Buyer.history_order",
+    "cancel_order": "Buyer.buyer_order_cancel",
+    "ship_order": "Seller.ship_order",
+    "receive_order": "Buyer.receive_order",
+    "add_funds": "Buyer.add_funds",
+    "add_stock_level": "Seller.add_stock_level",
+}
+
+LATENCY_METRICS = ("p50", "p90", "p99")
+
+# 基线中记录的指标，以及数值变大是否算变差
+METRICS = {
+    "throughput": False,
+    "p50": True,
+    "p90": True,
+    "p99": True,
+    "queries": True,
+}
+
+_statements_line = re.compile(r'^be_model_method_sql_statements_(sum|count)\{method="([^"]*)"\} (\S+)$')
+_info_line = re.compile(r'^be_info\{(.*)\} \S+$')
+_label = re.compile(r'(\w+)="([^"]*)"')
+
+
+class RegressionError(Exception):
+    pass
+
+
+# 从 /metrics 文本中取出各模型方法累计的 SQL 语句数和调用次数：{method: (sum, count)}
+def method_statements(metrics_text: str) -> dict:
+    totals = {}
+    for line in metrics_text.splitlines():
+        match = _statements_line.match(line)
+        if match is None:
+            continue
+        kind, method, value = match.groups()
+        total, count = totals.get(method, (0, 0))
+        if kind == "sum":
+            totals[method] = (float(value), count)
+        else:
+            totals[method] = (total, int(value))
+    return totals
+
+
+# 从 /metrics 文本的 be_info 中取出后端的部署信息：{"backend": ..., "server": ...}
+def server_info(metrics_text: str) -> dict:
+    for line in metrics_text.splitlines():
+        match = _info_line.match(line)
+        if match is not None:
+            return dict(_label.findall(match.group(1)))
+    return {}
+
+
+# 压测前后两次快照做差，得到压测期间每种操作平均执行的 SQL 语句数
+def queries_per_operation(before: dict, after: dict) -> dict:
+    queries = {}
+    for op, method in OPERATION_METHODS.items():
+        total, count = after.get(method, (0, 0))
+        past_total, past_count = before.get(method, (0, 0))
+        if count > past_count:
+            queries[op] = (total - past_total) / (count - past_count)
+    return queries
+
+
+# 压测报告中要进入基线的部分：每种操作的吞吐、延迟分位数和 SQL 语句数
+def summarize(report: dict) -> dict:
+    queries = report.get("queries", {})
+    operations = {}
+    for op, result in report["operations"].items():
+        summary = {
+            "throughput": result["throughput"],
+            "p50": result["latency"]["p50"],
+            "p90": result["latency"]["p90"],
+            "p99": result["latency"]["p99"],
+        }
+        if op in queries:
+            summary["queries"] = queries[op]
+        operations[op] = summary
+    return operations
+
+
+# 基线按 "模式/服务器/数据库后端/负载配置" 分别保存，不同部署、不同负载配置的结果互不比较
+def baseline_key(report: dict) -> str:
+    return "{}/{}/{}/{}".format(
+        report.get("mode", "http"),
+        report.get("server") or "unknown",
+        report.get("backend") or "unknown",
+        report.get("profile", conf.Workload_Profile),
+    )
+
+
+def load_baselines(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(report: dict, path: str = None):
+    path = path or conf.Bench_Baseline_File
+    baselines = load_baselines(path)
+    baselines[baseline_key(report)] = summarize(report)
+    with open(path, "w") as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+
+
+# 逐操作逐指标对比基线，change 为相对变化；gated 中的指标按变差方向超过 threshold 的记入 regressions。
+# 毫秒级的延迟抖动很容易超过相对阈值，延迟还要求绝对值变差超过 latency_tolerance 秒
+def compare(
+    baseline: dict, current: dict, threshold: float, latency_tolerance: float = 0.0, gated=tuple(METRICS)
+) -> dict:
+    operations = {}
+    regressions = []
+    for op, past in baseline.items():
+        now = current.get(op)
+        if now is None:
+            continue
+        metrics = {}
+        for metric, higher_is_worse in METRICS.items():
+            if metric not in past or metric not in now:
+                continue
+            change = (now[metric] - past[metric]) / past[metric] if past[metric] else 0.0
+            worse = change if higher_is_worse else -change
+            metrics[metric] = {"baseline": past[metric], "current": now[metric], "change": change}
+            if metric not in gated:
+                continue
+            if metric in LATENCY_METRICS and now[metric] - past[metric] <= latency_tolerance:
+                continue
+            if worse > threshold:
+                regressions.append({"operation": op, "metric": metric, **metrics[metric]})
+        operations[op] = metrics
+    return {"threshold": threshold, "operations": operations, "regressions": regressions}
+
+
+# 与基线比较并把差异写到 conf.Bench_Diff_File；conf.Bench_Update_Baseline 为真时把本次结果记为基线，
+# 还没有对应基线时不做比较
+def check_regression(report: dict, threshold: float = None) -> dict:
+    threshold = conf.Bench_Regression_Threshold if threshold is None else threshold
+    key = baseline_key(report)
+    if conf.Bench_Update_Baseline:
+        save_baseline(report)
+        logging.info("bench baseline {} recorded in {}".format(key, conf.Bench_Baseline_File))
+        return {"baseline": key, "threshold": threshold, "operations": {}, "regressions": []}
+    baseline = load_baselines(conf.Bench_Baseline_File).get(key)
+    if baseline is None:
+        logging.warning("no bench baseline {} in {}, skip regression check".format(key, conf.Bench_Baseline_File))
+        return {"baseline": None, "threshold": threshold, "operations": {}, "regressions": []}
+
+    diff = compare(
+        baseline, summarize(report), threshold, conf.Bench_Latency_Tolerance, conf.Bench_Gated_Metrics
+    )
+    diff = dict({"baseline": key}, **diff)
+    with open(conf.Bench_Diff_File, "w") as f:
+        json.dump(diff, f, indent=2)
+    for op, metrics in diff["operations"].items():
+        logging.info("{}: {}".format(op, " ".join(
+            "{}:{:.4g}->{:.4g}({:+.1%})".format(metric, m["baseline"], m["current"], m["change"])
+            for metric, m in metrics.items()
+        )))
+    for regression in diff["regressions"]:
+        logging.error("bench regression: {} {} {:.4g} -> {:.4g} ({:+.1%})".format(
+            regression["operation"], regression["metric"],
+            regression["baseline"], regression["current"], regression["change"]))
+    return diff
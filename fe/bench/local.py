@@ -0,0 +1,154 @@
+import json
+import functools
+from be import serve
+from be.model import metrics
+from be.model import store
+from be.model.buyer import Buyer
+from be.model.seller import Seller
+from be.model.user import User
+from fe.access import book
+
+
+# 进程内客户端：接口与 fe.access 中的 Auth/Buyer/Seller 相同，但直接调用 be.model，
+# 不经过 HTTP、Flask 和 JSON 编解码，也不做 token 校验，用来把数据库和模型的耗时单独量出来
+
+# 每次调用相当于一个请求，结束后像 serve.close_db_session 一样释放当前线程的会话
+def local_request(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            store.remove_db_conn()
+
+    return wrapper
+
+
+class LocalAuth:
+    @local_request
+    def login(self, user_id: str, password: str, terminal: str) -> (int, str):
+        code, _, token = User().login(user_id, password, terminal)
+        return code, token
+
+    @local_request
+    def register(self, user_id: str, password: str) -> int:
+        code, _ = User().register(user_id, password)
+        return code
+
+    @local_request
+    def search_books(self, query: str, search_scope: str, store_id=None, page: int = None) -> (int, [dict]):
+        code, _, books = User().search_books(query=query, search_scope=search_scope, store_id=store_id, page=page)
+        return code, books
+
+
+class LocalBuyer:
+    def __init__(self, user_id, password):
+        self.user_id = user_id
+        self.password = password
+        self.terminal = "my terminal"
+        self.auth = LocalAuth()
+        code, self.token = self.auth.login(self.user_id, self.password, self.terminal)
+        assert code == 200
+
+    @local_request
+    def new_order(self, store_id: str, book_id_and_count: [(str, int)]) -> (int, str):
+        code, _, order_id = Buyer().new_order(self.user_id, store_id, list(book_id_and_count))
+        return code, order_id
+
+    @local_request
+    def payment(self, order_id: str) -> int:
+        code, _ = Buyer().payment(self.user_id, self.password, order_id)
+        return code
+
+    @local_request
+    def add_funds(self, add_value) -> int:
+        code, _ = Buyer().add_funds(self.user_id, self.password, add_value)
+        return code
+
+    @local_request
+    def receive_order(self, user_id: str, order_id: str) -> int:
+        code, _ = Buyer().receive_order(user_id, order_id)
+        return code
+
+    @local_request
+    def buyer_order_cancel(self, user_id: str, order_id: str) -> int:
+        code, _ = Buyer().buyer_order_cancel(user_id, order_id)
+        return code
+
+    @local_request
+    def history_order(self, user_id: str, cursor: str = None, page_size: int = None) -> (int, [dict], str):
+        code, _, orders, next_cursor = Buyer().history_order(user_id, cursor, page_size)
+        return code, orders, next_cursor
+
+
+class LocalSeller:
+    def __init__(self, seller_id: str, password: str):
+        self.seller_id = seller_id
+        self.password = password
+        self.terminal = "my terminal"
+        self.auth = LocalAuth()
+        code, self.token = self.auth.login(self.seller_id, self.password, self.terminal)
+        assert code == 200
+
+    @local_request
+    def create_store(self, store_id) -> int:
+        code, _ = Seller().create_store(self.seller_id, store_id)
+        return code
+
+    # 书籍信息与 /seller/add_books 收到的一样序列化成 JSON 字符串
+    @local_request
+    def add_books(self, store_id: str, stock_level_and_books: [(int, book.Book)]) -> int:
+        books = [
+            (book_info.id, json.dumps(book_info.__dict__), stock_level)
+            for stock_level, book_info in stock_level_and_books
+        ]
+        code, _ = Seller().add_books(self.seller_id, store_id, books)
+        return code
+
+    @local_request
+    def add_stock_level(self, seller_id: str, store_id: str, book_id: str, add_stock_num: int) -> int:
+        code, _ = Seller().add_stock_level(seller_id, store_id, book_id, add_stock_num)
+        return code
+
+    @local_request
+    def ship_order(self, seller_id: str, store_id: str, order_id: str) -> int:
+        code, _ = Seller().ship_order(seller_id, store_id, order_id)
+        return code
+
+
+# 本进程还没有初始化数据库时（单独运行压测），按 be.serve 的环境变量配置初始化
+def ensure_database():
+    if store.database_instance is None:
+        store.init_database(serve.db_config())
+
+
+# Workload 用来创建客户端的工厂，与 workload.HttpClients 接口相同
+class LocalClients:
+    name = "local"
+
+    def __init__(self):
+        ensure_database()
+
+    @staticmethod
+    def auth() -> LocalAuth:
+        return LocalAuth()
+
+    @staticmethod
+    def buyer(user_id: str, password: str) -> LocalBuyer:
+        return LocalBuyer(user_id, password)
+
+    @staticmethod
+    def register_seller(user_id: str, password: str) -> LocalSeller:
+        code = LocalAuth().register(user_id, password)
+        assert code == 200
+        return LocalSeller(user_id, password)
+
+    @staticmethod
+    def register_buyer(user_id: str, password: str) -> LocalBuyer:
+        code = LocalAuth().register(user_id, password)
+        assert code == 200
+        return LocalBuyer(user_id, password)
+
+    @staticmethod
+    def metrics() -> str:
+        return metrics.render()
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import time
+import aiohttp
+from fe import conf
+from fe.bench.async_session import AsyncSession
+from fe.bench.stats import BenchStats
+from fe.bench.workload import Workload
+from fe.bench.workload import NewOrder
+from fe.bench.workload import Payment
+
+
+# 开环压测：按目标到达率（固定或线性爬升）发出下单请求，不等待前一个请求返回。
+# 延迟从计划发送时间算起，服务器变慢时排队的时间也计入延迟，避免协同遗漏（coordinated omission）
+class OpenLoopSession(AsyncSession):
+    def __init__(self, wl: Workload, rate: float, duration: float, ramp_to: float = None):
+        AsyncSession.__init__(self, wl)
+        self.rate = rate
+        self.duration = duration
+        self.ramp_to = rate if ramp_to is None else ramp_to
+
+    # 相对开始时间的计划发送时刻，到达率从 rate 线性变化到 ramp_to
+    def arrival_times(self):
+        t = 0.0
+        while t < self.duration:
+            yield t
+            t = t + 1 / (self.rate + (self.ramp_to - self.rate) * t / self.duration)
+
+    async def run_async(self):
+        connector = aiohttp.TCPConnector(limit=conf.Async_Max_Connections)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            await self.login_buyers(session)
+            # 登录不计入压测时间
+            self.workload.stats.begin()
+            await self.send()
+
+    # 按计划时刻发出下单请求，等待全部返回；买家须已登录
+    async def send(self):
+        tasks = set()
+        start = time.time()
+        for offset in self.arrival_times():
+            intended = start + offset
+            delay = intended - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            task = asyncio.create_task(self.transaction(intended))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    # 一次下单，成功后付款；付款依赖下单的结果，从下单返回时算起
+    async def transaction(self, intended: float):
+        buyer_no, store_id, book_id_and_count = self.workload.gen_new_order()
+        new_order = NewOrder(self.buyers[buyer_no], store_id, book_id_and_count)
+        try:
+            ok, order_id = await new_order.run_async()
+        except aiohttp.ClientError:
+            ok, new_order.code = False, 0
+        after = time.time()
+        self.workload.record("new_order", intended, after, new_order.code)
+        if not ok:
+            return
+
+        payment = Payment(new_order.buyer, order_id)
+        try:
+            await payment.run_async()
+        except aiohttp.ClientError:
+            payment.code = 0
+        self.workload.record("payment", after, time.time(), payment.code)
+
+
+# 逐级提高到达率，每级运行 step_seconds 秒，直到下单 p99 延迟超过阈值或错误率超过 1%；
+# 返回仍满足阈值的最高到达率和每一级的结果
+def find_capacity(
+    wl: Workload,
+    start_rate: float,
+    step: float,
+    max_rate: float,
+    step_seconds: float,
+    p99_threshold: float,
+) -> dict:
+    return asyncio.run(find_capacity_async(wl, start_rate, step, max_rate, step_seconds, p99_threshold))
+
+
+# 所有级别共用一个连接池，买家在搜索开始前登录一次；每级的统计在准备完成后才开始计时，
+# 登录的请求和耗时不计入任何一级
+async def find_capacity_async(
+    wl: Workload,
+    start_rate: float,
+    step: float,
+    max_rate: float,
+    step_seconds: float,
+    p99_threshold: float,
+) -> dict:
+    steps = []
+    sustainable_rate = 0
+    rate = start_rate
+    connector = aiohttp.TCPConnector(limit=conf.Async_Max_Connections)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        login = OpenLoopSession(wl, rate, step_seconds)
+        await login.login_buyers(session)
+        while rate <= max_rate:
+            open_loop = OpenLoopSession(wl, rate, step_seconds)
+            open_loop.buyers = login.buyers
+            wl.stats = BenchStats()
+            await open_loop.send()
+            wl.stats.finish()
+            new_order = wl.stats.report()["operations"].get("new_order")
+            if new_order is None:
+                break
+            p99 = new_order["latency"]["p99"]
+            result = {
+                "rate": rate,
+                "throughput": new_order["throughput"],
+                "p99": p99,
+                "error_rate": new_order["error_rate"],
+            }
+            steps.append(result)
+            logging.info("open loop rate {}: throughput {:.1f} p99 {:.4f} error rate {:.3f}".format(
+                rate, result["throughput"], p99, result["error_rate"]))
+            if p99 > p99_threshold or new_order["error_rate"] > 0.01:
+                break
+            sustainable_rate = rate
+            rate = rate + step
+    return {"sustainable_rate": sustainable_rate, "p99_threshold": p99_threshold, "steps": steps}
@@ -0,0 +1,63 @@
+import bisect
+import itertools
+import random
+
+# 压测负载配置，由 conf.Workload_Profile 选择：
+# book_skew / store_skew 是书籍和商铺热度的 Zipf 指数，0 表示均匀分布，越大热点越集中；
+# mix 是各类操作的权重，new_order 为下单后付款，其余见 workload.py 中的各个操作类
+PROFILES = {
+    "default": {
+        "book_skew": 0,
+        "store_skew": 0,
+        "mix": {"new_order": 1},
+    },
+    # 畅销书热点：少数书籍和商铺承担大部分订单，用来暴露库存行锁的竞争
+    "hotspot": {
+        "book_skew": 1.2,
+        "store_skew": 1.0,
+        "mix": {"new_order": 1},
+    },
+    # 接近真实流量的读写混合
+    "mixed": {
+        "book_skew": 0.99,
+        "store_skew": 0.8,
+        "mix": {
+            "new_order": 40,
+            "search": 25,
+            "history_order": 10,
+            "cancel_order": 8,
+            "ship_receive": 8,
+            "add_funds": 5,
+            "add_stock_level": 4,
+        },
+    },
+}
+
+
+# 在 [0, n) 上按 Zipf 分布取下标，下标越小越热；skew 为 0 时与原来的均匀取法相同
+class ZipfSampler:
+    def __init__(self, n: int, skew: float):
+        self.n = n
+        self.skew = skew
+        self.cumulative = list(itertools.accumulate(1 / (k ** skew) for k in range(1, n + 1)))
+
+    def sample(self) -> int:
+        if self.skew == 0:
+            return int(random.uniform(0, self.n - 1))
+        return bisect.bisect_left(self.cumulative, random.random() * self.cumulative[-1])
+
+
+class Profile:
+    def __init__(self, name: str):
+        if name not in PROFILES:
+            raise ValueError("unknown workload profile {}".format(name))
+        config = PROFILES[name]
+        self.name = name
+        self.book_skew = config["book_skew"]
+        self.store_skew = config["store_skew"]
+        self.operations = list(config["mix"])
+        self.weights = list(itertools.accumulate(config["mix"].values()))
+
+    # 按权重随机选一种操作
+    def choose_operation(self) -> str:
+        return self.operations[bisect.bisect_right(self.weights, random.random() * self.weights[-1])]
@@ -1,9 +1,19 @@
+import json
+import logging
+import os
 from fe.bench.workload import Workload
 from fe.bench.session import Session
+from fe.bench.async_session import AsyncSession
+from fe.bench.open_loop import OpenLoopSession, find_capacity
+from fe.bench.local import LocalClients
+from fe.bench.stats import compare_reports
+from fe.bench.baseline import check_regression, RegressionError
+from fe import conf
 
 
-def run_bench():
-    wl = Workload()
+# clients 为空时经 HTTP 访问后端，传入 LocalClients 时在进程内直接调用 be.model
+def run_bench(clients=None, report_file: str = None):
+    wl = Workload(clients)
     wl.gen_database()
 
     sessions = []
@@ -11,11 +21,91 @@ def run_bench():
         ss = Session(wl)
         sessions.append(ss)
 
+    wl.begin()
     for ss in sessions:
         ss.start()
 
     for ss in sessions:
         ss.join()
+    return wl.write_report(report_file)
+
+
+# 回归压测：运行 run_bench 并与 conf.Bench_Baseline_File 中的基线比较，
+# 任一操作的吞吐、延迟或 SQL 语句数变差超过 conf.Bench_Regression_Threshold 时失败；没有对应基线时不做比较
+def run_regression_bench() -> dict:
+    diff = check_regression(run_bench())
+    if diff["regressions"]:
+        raise RegressionError("{} metrics regressed beyond {:.0%}, see {}".format(
+            len(diff["regressions"]), diff["threshold"], conf.Bench_Diff_File))
+    return diff
+
+
+# 进程内压测：同样的负载和统计，不经过 HTTP
+def run_local_bench(report_file: str = None):
+    return run_bench(LocalClients(), report_file)
+
+
+# 同一负载先经 HTTP、再在进程内各跑一遍，两份报告分别写到 bench_report_http/local.json，
+# 逐操作的延迟对比写到 conf.Bench_Comparison_File
+def run_comparison_bench() -> dict:
+    base = os.path.splitext(conf.Bench_Report_File)[0]
+    http = run_bench(report_file=base + "_http.json")
+    local = run_local_bench(base + "_local.json")
+    comparison = compare_reports(http, local)
+    with open(conf.Bench_Comparison_File, "w") as f:
+        json.dump(comparison, f, indent=2)
+    for op, result in comparison["operations"].items():
+        logging.info(
+            "{}: HTTP P50:{:.4f} P99:{:.4f} LOCAL P50:{:.4f} P99:{:.4f} OVERHEAD P50:{:.4f} ({:.0%})".format(
+                op, result["http"]["p50"], result["http"]["p99"],
+                result["local"]["p50"], result["local"]["p99"],
+                result["overhead"]["p50"], result["overhead_share"],
+            )
+        )
+    return comparison
+
+
+# 用 asyncio 虚拟用户代替线程，单进程模拟 conf.Async_Virtual_Users 个并发买家
+def run_async_bench():
+    wl = Workload()
+    wl.gen_database()
+
+    wl.begin()
+    AsyncSession(wl).run()
+    return wl.write_report()
+
+
+# 开环压测：按 conf.Open_Loop_Rate 的到达率运行 conf.Open_Loop_Duration 秒，
+# conf.Open_Loop_Ramp_To 不为空时到达率线性爬升到该值
+def run_open_loop_bench(rate: float = None, duration: float = None, ramp_to: float = None):
+    wl = Workload()
+    wl.gen_database()
+
+    wl.begin()
+    OpenLoopSession(
+        wl,
+        rate or conf.Open_Loop_Rate,
+        duration or conf.Open_Loop_Duration,
+        ramp_to or conf.Open_Loop_Ramp_To,
+    ).run()
+    return wl.write_report()
+
+
+# 寻找下单 p99 延迟不超过 conf.Open_Loop_Latency_Threshold 时可持续的最高到达率
+def run_capacity_search():
+    wl = Workload()
+    wl.gen_database()
+
+    wl.begin()
+    capacity = find_capacity(
+        wl,
+        conf.Open_Loop_Rate,
+        conf.Capacity_Rate_Step,
+        conf.Capacity_Max_Rate,
+        conf.Open_Loop_Duration,
+        conf.Open_Loop_Latency_Threshold,
+    )
+    return wl.write_report(extra={"capacity": capacity})
 
 #
 # if __name__ == "__main__":
@@ -9,7 +9,6 @@ class Session(threading.Thread):
     def __init__(self, wl: Workload):
         threading.Thread.__init__(self)
         self.workload = wl
-        self.new_order_request = []
         self.payment_request = []
         self.payment_i = 0
         self.new_order_i = 0
@@ -18,44 +17,60 @@ class Session(threading.Thread):
         self.time_new_order = 0
         self.time_payment = 0
         self.thread = None
-        self.gen_procedure()
+        self.reported = (0, 0, 0, 0, 0, 0)
 
+    # 按需逐个生成操作，不预先生成整个会话的请求
     def gen_procedure(self):
         for i in range(0, self.workload.procedure_per_session):
-            new_order = self.workload.get_new_order()
-            self.new_order_request.append(new_order)
+            yield self.workload.get_procedure()
 
     def run(self):
         self.run_gut()
 
     def run_gut(self):
-        for new_order in self.new_order_request:
+        for procedure in self.gen_procedure():
+            # 负载配置中除下单外的其他操作，由操作类自己记录统计
+            if not isinstance(procedure, NewOrder):
+                procedure.run(self.workload)
+                continue
+
+            new_order = procedure
             before = time.time()
             ok, order_id = new_order.run()
             after = time.time()
+            self.workload.record("new_order", before, after, new_order.code)
             self.time_new_order = self.time_new_order + after - before
             self.new_order_i = self.new_order_i + 1
             if ok:
                 self.new_order_ok = self.new_order_ok + 1
                 payment = Payment(new_order.buyer, order_id)
                 self.payment_request.append(payment)
-            if self.new_order_i % 100 or self.new_order_i == len(
-                self.new_order_request
-            ):
-                self.workload.update_stat(
-                    self.new_order_i,
-                    self.payment_i,
-                    self.new_order_ok,
-                    self.payment_ok,
-                    self.time_new_order,
-                    self.time_payment,
-                )
-                for payment in self.payment_request:
-                    before = time.time()
-                    ok = payment.run()
-                    after = time.time()
-                    self.time_payment = self.time_payment + after - before
-                    self.payment_i = self.payment_i + 1
-                    if ok:
-                        self.payment_ok = self.payment_ok + 1
-                self.payment_request = []
+            if self.new_order_i % 100:
+                self.run_payments()
+        self.run_payments()
+
+    def run_payments(self):
+        for payment in self.payment_request:
+            before = time.time()
+            ok = payment.run()
+            after = time.time()
+            self.workload.record("payment", before, after, payment.code)
+            self.time_payment = self.time_payment + after - before
+            self.payment_i = self.payment_i + 1
+            if ok:
+                self.payment_ok = self.payment_ok + 1
+        self.payment_request = []
+        self.update_stat()
+
+    # 向 Workload 汇报自上次汇报以来的增量
+    def update_stat(self):
+        current = (
+            self.new_order_i,
+            self.payment_i,
+            self.new_order_ok,
+            self.payment_ok,
+            self.time_new_order,
+            self.time_payment,
+        )
+        self.workload.update_stat(*[now - past for now, past in zip(current, self.reported)])
+        self.reported = current
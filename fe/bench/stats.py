@@ -0,0 +1,148 @@
+import csv
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+# HDR 风格的延迟直方图：以微秒记录，每个 2 的幂区间分成 2^significant_bits 个子桶，
+# 相对误差小于 1%，内存只与数值范围有关，与请求数无关
+class LatencyHistogram:
+    significant_bits = 7
+
+    def __init__(self):
+        self.counts = Counter()
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, seconds: float):
+        value = max(int(seconds * 1000000), 0)
+        shift = max(value.bit_length() - self.significant_bits, 0)
+        self.counts[(value >> shift) << shift] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    # 第 p 百分位的延迟（秒），取所在子桶的上界，不超过最大值
+    def percentile(self, p: float) -> float:
+        if self.count == 0:
+            return 0.0
+        rank = max(p / 100 * self.count, 1)
+        cumulative = 0
+        for key in sorted(self.counts):
+            cumulative += self.counts[key]
+            if cumulative >= rank:
+                shift = max(key.bit_length() - self.significant_bits, 0)
+                return min(key + (1 << shift) - 1, self.max) / 1000000
+        return self.max / 1000000
+
+    def summary(self) -> dict:
+        result = {"p{}".format(p): self.percentile(p) for p in PERCENTILES}
+        result["max"] = self.max / 1000000
+        result["mean"] = self.total / self.count / 1000000 if self.count else 0.0
+        return result
+
+
+# 压测过程中每个请求的统计：按操作类型的延迟直方图、按状态码的计数、每秒吞吐时间线
+class BenchStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start = time.time()
+        self.end = None
+        self.latency = {}
+        self.status = {}
+        self.timeline = {}
+
+    def begin(self):
+        with self.lock:
+            self.start = time.time()
+
+    def finish(self):
+        with self.lock:
+            self.end = time.time()
+
+    # 记录一次请求：操作类型、发出和返回的时间、HTTP 状态码
+    def record(self, op: str, before: float, after: float, code: int):
+        with self.lock:
+            if op not in self.latency:
+                self.latency[op] = LatencyHistogram()
+                self.status[op] = Counter()
+            self.latency[op].record(after - before)
+            self.status[op][code] += 1
+            second = self.timeline.setdefault(int(after - self.start), {})
+            ok, errors = second.get(op, (0, 0))
+            second[op] = (ok + 1, errors) if code == 200 else (ok, errors + 1)
+
+    def percentile(self, op: str, p: float) -> float:
+        with self.lock:
+            histogram = self.latency.get(op)
+            return histogram.percentile(p) if histogram is not None else 0.0
+
+    def report(self) -> dict:
+        with self.lock:
+            duration = (self.end or time.time()) - self.start
+            operations = {}
+            for op, histogram in self.latency.items():
+                status = self.status[op]
+                ok = status.get(200, 0)
+                operations[op] = {
+                    "count": histogram.count,
+                    "ok": ok,
+                    "throughput": ok / duration if duration > 0 else 0.0,
+                    "error_rate": (histogram.count - ok) / histogram.count,
+                    "status": {str(code): n for code, n in sorted(status.items())},
+                    "latency": histogram.summary(),
+                }
+            timeline = [
+                dict({"second": second}, **{
+                    op: {"ok": ok, "errors": errors} for op, (ok, errors) in self.timeline[second].items()
+                })
+                for second in sorted(self.timeline)
+            ]
+            return {"duration": duration, "operations": operations, "timeline": timeline}
+
+    # 写出 JSON 报告，并在同名 .csv 文件中写出每秒吞吐时间线
+    def write_report(self, path: str, extra: dict = None) -> dict:
+        report = self.report()
+        if extra:
+            report.update(extra)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+
+        with open(os.path.splitext(path)[0] + ".csv", "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["second", "operation", "ok", "errors"])
+            for row in report["timeline"]:
+                for op in sorted(k for k in row if k != "second"):
+                    writer.writerow([row["second"], op, row[op]["ok"], row[op]["errors"]])
+        return report
+
+
+# 对比同一负载经 HTTP 和进程内运行的两份报告：每种操作的延迟分位数、两者之差
+# （HTTP、Flask 和 JSON 编解码的开销）以及开销在 HTTP 延迟中的占比
+def compare_reports(http: dict, local: dict) -> dict:
+    operations = {}
+    for op, http_result in http["operations"].items():
+        local_result = local["operations"].get(op)
+        if local_result is None:
+            continue
+        http_latency = http_result["latency"]
+        local_latency = local_result["latency"]
+        overhead = {
+            key: http_latency[key] - local_latency[key]
+            for key in ("p50", "p90", "p99", "mean")
+        }
+        operations[op] = {
+            "http": {key: http_latency[key] for key in overhead},
+            "local": {key: local_latency[key] for key in overhead},
+            "overhead": overhead,
+            "overhead_share": overhead["p50"] / http_latency["p50"] if http_latency["p50"] > 0 else 0.0,
+            "http_throughput": http_result["throughput"],
+            "local_throughput": local_result["throughput"],
+        }
+    return {"operations": operations}
@@ -0,0 +1,92 @@
+import logging
+from sqlalchemy import func
+from be.model import store
+from fe.bench.local import ensure_database
+
+# 已付款的订单状态：2 已付款，4 已发货（收货后仍为 4）；3 为已取消，库存已归还、已付款的已退款
+PAID_STATUS = (2, 4)
+CANCELLED_STATUS = 3
+
+
+class ConsistencyError(Exception):
+    pass
+
+
+def check(name: str, expected, actual) -> dict:
+    return {"name": name, "expected": expected, "actual": actual, "ok": expected == actual}
+
+
+# 压测结束后用几条聚合查询核对本次 workload（用户、商铺 ID 都带有 wl.uuid）的守恒关系：
+# 1. 库存：上架总量 + 补货量 == 商铺剩余库存 + 未取消订单中的数量
+# 2. 资金：买家初始资金 + 充值 == 买家和卖家的余额之和
+# 3. 付款：每个买家的余额 == 初始资金 + 充值 - 已付款订单总价，每个卖家的余额 == 其商铺已付款订单总价
+# 所有查询在同一个事务中执行，看到的是同一时刻的数据。
+# 校验直接连接数据库，查不到本次 workload 的任何用户说明与后端连的不是同一个库，此时抛出 RuntimeError
+def verify(wl) -> dict:
+    ensure_database()
+    pattern = "%{}".format(wl.uuid)
+    session = store.get_db_conn()
+    try:
+        remaining_stock = session.query(func.coalesce(func.sum(store.Store.stock_level), 0)).filter(
+            store.Store.store_id.like(pattern)
+        ).scalar()
+        ordered_stock = (
+            session.query(func.coalesce(func.sum(store.NewOrderDetail.count), 0))
+            .join(store.Orders, store.Orders.order_id == store.NewOrderDetail.order_id)
+            .filter(store.Orders.store_id.like(pattern), store.Orders.status != CANCELLED_STATUS)
+            .scalar()
+        )
+        balances = dict(
+            session.query(store.User.user_id, store.User.balance).filter(store.User.user_id.like(pattern))
+        )
+        paid_by_buyer = dict(
+            session.query(store.Orders.user_id, func.sum(store.Orders.total_price))
+            .filter(store.Orders.store_id.like(pattern), store.Orders.status.in_(PAID_STATUS))
+            .group_by(store.Orders.user_id)
+        )
+        paid_to_seller = dict(
+            session.query(store.UserStore.user_id, func.sum(store.Orders.total_price))
+            .join(store.Orders, store.Orders.store_id == store.UserStore.store_id)
+            .filter(store.Orders.store_id.like(pattern), store.Orders.status.in_(PAID_STATUS))
+            .group_by(store.UserStore.user_id)
+        )
+        session.rollback()
+    finally:
+        store.remove_db_conn()
+    if not balances:
+        raise RuntimeError(
+            "users of workload {} not found, the verifier is not connected to the backend's database".format(wl.uuid)
+        )
+
+    initial_stock = len(wl.store_ids) * len(wl.book_ids) * wl.stock_level + wl.added_stock
+    initial_funds = len(wl.buyer_ids) * wl.user_funds + sum(wl.added_funds.values())
+    sellers = set(seller.seller_id for seller in wl.store_sellers.values())
+
+    checks = [
+        check("stock", initial_stock, int(remaining_stock) + int(ordered_stock)),
+        check("money", initial_funds, sum(int(balance) for balance in balances.values())),
+    ]
+    buyer_mismatches = {
+        buyer_id: {
+            "expected": wl.user_funds + wl.added_funds.get(buyer_id, 0) - int(paid_by_buyer.get(buyer_id, 0)),
+            "actual": balances.get(buyer_id),
+        }
+        for buyer_id in wl.buyer_ids
+    }
+    seller_mismatches = {
+        seller_id: {"expected": int(paid_to_seller.get(seller_id, 0)), "actual": balances.get(seller_id)}
+        for seller_id in sellers
+    }
+    mismatches = {
+        user_id: balance
+        for user_id, balance in dict(buyer_mismatches, **seller_mismatches).items()
+        if balance["expected"] != balance["actual"]
+    }
+    checks.append(check("paid_orders", 0, len(mismatches)))
+
+    ok = all(c["ok"] for c in checks)
+    for c in checks:
+        if not c["ok"]:
+            logging.error("consistency check {} failed: expected {} actual {}".format(
+                c["name"], c["expected"], c["actual"]))
+    return {"ok": ok, "checks": checks, "mismatched_balances": mismatches}
@@ -1,11 +1,22 @@
+import itertools
 import logging
 import uuid
 import random
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urljoin
 from fe.access import book
+from fe.access import http
 from fe.access.new_seller import register_new_seller
 from fe.access.new_buyer import register_new_buyer
+from fe.access.auth import Auth
 from fe.access.buyer import Buyer
+from fe.access.seller import Seller
+from fe.bench.stats import BenchStats
+from fe.bench.profile import Profile, ZipfSampler
+from fe.bench import baseline
+from fe.bench import verify
 from fe import conf
 
 
@@ -14,28 +25,167 @@ class NewOrder:
         self.buyer = buyer
         self.store_id = store_id
         self.book_id_and_count = book_id_and_count
+        self.code = None
 
     def run(self) -> (bool, str):
-        code, order_id = self.buyer.new_order(self.store_id, self.book_id_and_count)
-        return code == 200, order_id
+        self.code, order_id = self.buyer.new_order(self.store_id, self.book_id_and_count)
+        return self.code == 200, order_id
+
+    # buyer 为 AsyncBuyer 时在协程中执行
+    async def run_async(self) -> (bool, str):
+        self.code, order_id = await self.buyer.new_order(self.store_id, self.book_id_and_count)
+        return self.code == 200, order_id
 
 
 class Payment:
     def __init__(self, buyer: Buyer, order_id):
         self.buyer = buyer
         self.order_id = order_id
+        self.code = None
 
     def run(self) -> bool:
-        code = self.buyer.payment(self.order_id)
-        return code == 200
+        self.code = self.buyer.payment(self.order_id)
+        return self.code == 200
+
+    async def run_async(self) -> bool:
+        self.code = await self.buyer.payment(self.order_id)
+        return self.code == 200
+
+
+# 以下操作类由负载配置的 mix 选出，run 时自己把每个请求记录到 workload 的统计中
+class SearchBooks:
+    def __init__(self, auth: Auth, query: str):
+        self.auth = auth
+        self.query = query
+
+    def run(self, wl):
+        before = time.time()
+        code, _ = self.auth.search_books(self.query, "title")
+        wl.record("search", before, time.time(), code)
+
+
+class HistoryOrder:
+    def __init__(self, buyer: Buyer):
+        self.buyer = buyer
+
+    def run(self, wl):
+        before = time.time()
+        code, _, _ = self.buyer.history_order(self.buyer.user_id)
+        wl.record("history_order", before, time.time(), code)
+
+
+# 下单后取消，已扣减的库存要归还
+class CancelOrder:
+    def __init__(self, new_order: NewOrder):
+        self.new_order = new_order
+
+    def run(self, wl):
+        before = time.time()
+        ok, order_id = self.new_order.run()
+        wl.record("new_order", before, time.time(), self.new_order.code)
+        if not ok:
+            return
+        buyer = self.new_order.buyer
+        before = time.time()
+        code = buyer.buyer_order_cancel(buyer.user_id, order_id)
+        wl.record("cancel_order", before, time.time(), code)
+
+
+# 完整的订单流程：下单、付款、发货、收货
+class ShipReceive:
+    def __init__(self, new_order: NewOrder, seller: Seller):
+        self.new_order = new_order
+        self.seller = seller
+
+    def run(self, wl):
+        before = time.time()
+        ok, order_id = self.new_order.run()
+        wl.record("new_order", before, time.time(), self.new_order.code)
+        if not ok:
+            return
+        payment = Payment(self.new_order.buyer, order_id)
+        before = time.time()
+        ok = payment.run()
+        wl.record("payment", before, time.time(), payment.code)
+        if not ok:
+            return
+        before = time.time()
+        code = self.seller.ship_order(self.seller.seller_id, self.new_order.store_id, order_id)
+        wl.record("ship_order", before, time.time(), code)
+        if code != 200:
+            return
+        buyer = self.new_order.buyer
+        before = time.time()
+        code = buyer.receive_order(buyer.user_id, order_id)
+        wl.record("receive_order", before, time.time(), code)
+
+
+class AddFunds:
+    def __init__(self, buyer: Buyer, add_value: int):
+        self.buyer = buyer
+        self.add_value = add_value
+
+    def run(self, wl):
+        before = time.time()
+        code = self.buyer.add_funds(self.add_value)
+        wl.record("add_funds", before, time.time(), code)
+        if code == 200:
+            wl.record_funds(self.buyer.user_id, self.add_value)
+
+
+class AddStockLevel:
+    def __init__(self, seller: Seller, store_id: str, book_id: str, add_stock_level: int):
+        self.seller = seller
+        self.store_id = store_id
+        self.book_id = book_id
+        self.add_stock_level = add_stock_level
+
+    def run(self, wl):
+        before = time.time()
+        code = self.seller.add_stock_level(self.seller.seller_id, self.store_id, self.book_id, self.add_stock_level)
+        wl.record("add_stock_level", before, time.time(), code)
+        if code == 200:
+            wl.record_stock(self.add_stock_level)
+
+
+# 通过 HTTP 访问后端的客户端工厂；进程内直接调用 be.model 的见 local.LocalClients
+class HttpClients:
+    name = "http"
+
+    @staticmethod
+    def auth() -> Auth:
+        return Auth(conf.URL)
+
+    @staticmethod
+    def buyer(user_id: str, password: str) -> Buyer:
+        return Buyer(url_prefix=conf.URL, user_id=user_id, password=password)
+
+    @staticmethod
+    def register_seller(user_id: str, password: str) -> Seller:
+        return register_new_seller(user_id, password)
+
+    @staticmethod
+    def register_buyer(user_id: str, password: str) -> Buyer:
+        return register_new_buyer(user_id, password)
+
+    @staticmethod
+    def metrics() -> str:
+        return http.get_session().get(urljoin(conf.URL, "metrics")).text
 
 
 class Workload:
-    def __init__(self):
+    def __init__(self, clients=None):
         self.uuid = str(uuid.uuid1())
         self.book_ids = []
+        self.book_titles = {}
         self.buyer_ids = []
         self.store_ids = []
+        self.store_sellers = {}
+        self.profile = Profile(conf.Workload_Profile)
+        self.book_sampler: ZipfSampler = None
+        self.store_sampler: ZipfSampler = None
+        self.clients = clients or HttpClients()
+        self.auth = self.clients.auth()
         self.book_db = book.BookDB(conf.Use_Large_DB)
         self.row_count = self.book_db.get_book_count()
 
@@ -49,6 +199,8 @@ class Workload:
         self.stock_level = conf.Default_Stock_Level
         self.user_funds = conf.Default_User_Funds
         self.batch_size = conf.Data_Batch_Size
+        self.load_workers = conf.Load_Workers
+        self.load_stats = {}
         self.procedure_per_session = conf.Request_Per_Session
 
         self.n_new_order = 0
@@ -58,6 +210,15 @@ class Workload:
         self.time_new_order = 0
         self.time_payment = 0
         self.lock = threading.Lock()
+        self.stats = BenchStats()
+        # 买家编号 -> 已登录的 Buyer，所有会话共用；同一买家重新登录会使之前的 token 失效
+        self.buyers = {}
+        self.buyers_lock = threading.Lock()
+        self.statements_before = {}
+        self.server_info = {}
+        # 压测期间成功的充值（买家 -> 金额）和补货总量，结束后核对数据一致性用
+        self.added_funds = {}
+        self.added_stock = 0
         # 存储上一次的值，用于两次做差
         self.n_new_order_past = 0
         self.n_payment_past = 0
@@ -77,46 +238,107 @@ class Workload:
     def to_store_id(self, seller_no: int, i):
         return "store_s_{}_{}_{}".format(seller_no, i, self.uuid)
 
+    # 按批读取要上架的书，顺序扫描只读一遍，所有商铺共用
+    def iter_book_batches(self):
+        books = self.book_db.iter_books(self.batch_size, conf.Load_Book_Pictures)
+        while True:
+            batch = list(itertools.islice(books, self.batch_size))
+            if len(batch) == 0:
+                break
+            yield batch
+
+    # 并行灌数据：卖家、商铺、买家的注册分散到 conf.Load_Workers 个线程，
+    # 书籍按批用 /seller/add_books 批量上架，同时在途的批次数有上限，内存占用与书籍总数无关
     def gen_database(self):
         logging.info("load data")
-        for i in range(1, self.seller_num + 1):
-            user_id, password = self.to_seller_id_and_password(i)
-            seller = register_new_seller(user_id, password)
-            for j in range(1, self.store_num_per_user + 1):
-                store_id = self.to_store_id(i, j)
-                code = seller.create_store(store_id)
-                assert code == 200
-                self.store_ids.append(store_id)
-                row_no = 0
-
-                while row_no < self.book_num_per_store:
-                    books = self.book_db.get_book_info(row_no, self.batch_size)
-                    if len(books) == 0:
-                        break
-                    for bk in books:
-                        code = seller.add_book(store_id, self.stock_level, bk)
-                        assert code == 200
-                        if i == 1 and j == 1:
-                            self.book_ids.append(bk.id)
-                    row_no = row_no + len(books)
-        logging.info("seller data loaded.")
-        for k in range(1, self.buyer_num + 1):
-            user_id, password = self.to_buyer_id_and_password(k)
-            buyer = register_new_buyer(user_id, password)
-            buyer.add_funds(self.user_funds)
-            self.buyer_ids.append(user_id)
-        logging.info("buyer data loaded.")
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=self.load_workers) as pool:
+            sellers = list(pool.map(self.load_seller, range(1, self.seller_num + 1)))
+            stores = [
+                (seller, store_id)
+                for seller, store_ids in sellers
+                for store_id in store_ids
+            ]
+            self.store_ids.extend(store_id for _, store_id in stores)
+            self.store_sellers.update((store_id, seller) for seller, store_id in stores)
 
-    def get_new_order(self) -> NewOrder:
+            n_books = 0
+            pending = set()
+            for books in self.iter_book_batches():
+                books = books[:self.book_num_per_store - len(self.book_ids)]
+                if len(books) == 0:
+                    break
+                self.book_ids.extend(bk.id for bk in books)
+                self.book_titles.update((bk.id, bk.title) for bk in books)
+                stock_level_and_books = [(self.stock_level, bk) for bk in books]
+                for seller, store_id in stores:
+                    if len(pending) >= self.load_workers * 2:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        n_books += self.check_loaded(done)
+                    pending.add(pool.submit(self.load_books, seller, store_id, stock_level_and_books))
+            n_books += self.check_loaded(pending)
+            seller_time = time.time() - start
+            logging.info("seller data loaded: {} books in {:.1f}s, {:.1f} books/s".format(
+                n_books, seller_time, n_books / seller_time if seller_time > 0 else 0))
+
+            buyer_start = time.time()
+            buyers = pool.map(self.load_buyer, range(1, self.buyer_num + 1))
+            for k, buyer in enumerate(buyers, 1):
+                self.buyer_ids.append(buyer.user_id)
+                self.buyers[k] = buyer
+            buyer_time = time.time() - buyer_start
+            logging.info("buyer data loaded: {} buyers in {:.1f}s, {:.1f} buyers/s".format(
+                self.buyer_num, buyer_time, self.buyer_num / buyer_time if buyer_time > 0 else 0))
+
+        self.book_sampler = ZipfSampler(len(self.book_ids), self.profile.book_skew)
+        self.store_sampler = ZipfSampler(len(self.store_ids), self.profile.store_skew)
+        self.load_stats = {
+            "books": n_books,
+            "buyers": self.buyer_num,
+            "seconds": time.time() - start,
+            "books_per_second": n_books / seller_time if seller_time > 0 else 0,
+            "buyers_per_second": self.buyer_num / buyer_time if buyer_time > 0 else 0,
+        }
+
+    # 注册一个卖家并创建他的商铺
+    def load_seller(self, no: int) -> (Seller, [str]):
+        user_id, password = self.to_seller_id_and_password(no)
+        seller = self.clients.register_seller(user_id, password)
+        store_ids = []
+        for j in range(1, self.store_num_per_user + 1):
+            store_id = self.to_store_id(no, j)
+            code = seller.create_store(store_id)
+            assert code == 200
+            store_ids.append(store_id)
+        return seller, store_ids
+
+    @staticmethod
+    def load_books(seller: Seller, store_id: str, stock_level_and_books: [(int, book.Book)]) -> int:
+        code = seller.add_books(store_id, stock_level_and_books)
+        assert code == 200
+        return len(stock_level_and_books)
+
+    @staticmethod
+    def check_loaded(futures) -> int:
+        return sum(future.result() for future in futures)
+
+    def load_buyer(self, no: int) -> Buyer:
+        user_id, password = self.to_buyer_id_and_password(no)
+        buyer = self.clients.register_buyer(user_id, password)
+        code = buyer.add_funds(self.user_funds)
+        assert code == 200
+        return buyer
+
+    # 随机生成一个订单：(买家编号, 商铺ID, [(书籍ID, 数量)])
+    def gen_new_order(self) -> (int, str, [(str, int)]):
         n = random.randint(1, self.buyer_num)
-        buyer_id, buyer_password = self.to_buyer_id_and_password(n)
-        store_no = int(random.uniform(0, len(self.store_ids) - 1))
+        store_no = self.store_sampler.sample()
         store_id = self.store_ids[store_no]
         books = random.randint(1, 10)
         book_id_and_count = []
         book_temp = []
         for i in range(0, books):
-            book_no = int(random.uniform(0, len(self.book_ids) - 1))
+            book_no = self.book_sampler.sample()
             book_id = self.book_ids[book_no]
             if book_id in book_temp:
                 continue
@@ -124,10 +346,66 @@ class Workload:
                 book_temp.append(book_id)
                 count = random.randint(1, 10)
                 book_id_and_count.append((book_id, count))
-        b = Buyer(url_prefix=conf.URL, user_id=buyer_id, password=buyer_password)
-        new_ord = NewOrder(b, store_id, book_id_and_count)
+        return n, store_id, book_id_and_count
+
+    # 取已登录的买家客户端，没有时登录一次并缓存
+    def get_buyer(self, n: int) -> Buyer:
+        with self.buyers_lock:
+            b = self.buyers.get(n)
+            if b is None:
+                buyer_id, buyer_password = self.to_buyer_id_and_password(n)
+                b = self.clients.buyer(buyer_id, buyer_password)
+                self.buyers[n] = b
+            return b
+
+    def get_new_order(self) -> NewOrder:
+        n, store_id, book_id_and_count = self.gen_new_order()
+        new_ord = NewOrder(self.get_buyer(n), store_id, book_id_and_count)
         return new_ord
 
+    # 按负载配置的 mix 生成下一个操作
+    def get_procedure(self):
+        op = self.profile.choose_operation()
+        if op == "new_order":
+            return self.get_new_order()
+        if op == "search":
+            title = self.book_titles.get(self.book_ids[self.book_sampler.sample()]) or ""
+            return SearchBooks(self.auth, title[:8])
+        if op == "history_order":
+            return HistoryOrder(self.get_buyer(random.randint(1, self.buyer_num)))
+        if op == "cancel_order":
+            return CancelOrder(self.get_new_order())
+        if op == "ship_receive":
+            new_order = self.get_new_order()
+            return ShipReceive(new_order, self.store_sellers[new_order.store_id])
+        if op == "add_funds":
+            return AddFunds(self.get_buyer(random.randint(1, self.buyer_num)), random.randint(1, 1000))
+        if op == "add_stock_level":
+            store_id = self.store_ids[self.store_sampler.sample()]
+            book_id = self.book_ids[self.book_sampler.sample()]
+            return AddStockLevel(self.store_sellers[store_id], store_id, book_id, random.randint(1, 100))
+        raise ValueError("unknown operation {}".format(op))
+
+    # 压测开始：记下开始时间、后端的部署信息和各模型方法累计的 SQL 语句数，结束时做差得到每次操作的语句数
+    def begin(self):
+        metrics_text = self.clients.metrics()
+        self.server_info = baseline.server_info(metrics_text)
+        self.statements_before = baseline.method_statements(metrics_text)
+        self.stats.begin()
+
+    # 记录一次请求的延迟和状态码
+    def record(self, op: str, before: float, after: float, code: int):
+        self.stats.record(op, before, after, code)
+
+    def record_funds(self, user_id: str, add_value: int):
+        with self.lock:
+            self.added_funds[user_id] = self.added_funds.get(user_id, 0) + add_value
+
+    def record_stock(self, add_stock_level: int):
+        with self.lock:
+            self.added_stock = self.added_stock + add_stock_level
+
+    # 各个会话汇报自上次汇报以来的增量，记录进度日志
     def update_stat(
         self,
         n_new_order,
@@ -137,58 +415,75 @@ class Workload:
         time_new_order,
         time_payment,
     ):
-        # 获取当前并发数
-        thread_num = len(threading.enumerate())
-        # 加索
-        self.lock.acquire()
-        self.n_new_order = self.n_new_order + n_new_order
-        self.n_payment = self.n_payment + n_payment
-        self.n_new_order_ok = self.n_new_order_ok + n_new_order_ok
-        self.n_payment_ok = self.n_payment_ok + n_payment_ok
-        self.time_new_order = self.time_new_order + time_new_order
-        self.time_payment = self.time_payment + time_payment
-        # 计算这段时间内新创建订单的总数目
-        n_new_order_diff = self.n_new_order - self.n_new_order_past
-        # 计算这段时间内新付款订单的总数目
-        n_payment_diff = self.n_payment - self.n_payment_past
-
-        if (
-            self.n_payment != 0
-            and self.n_new_order != 0
-            and (self.time_payment + self.time_new_order)
-        ):
-            # TPS_C(吞吐量):成功创建订单数量/(提交订单时间/提交订单并发数 + 提交付款订单时间/提交付款订单并发数)
-            # NO=OK:新创建订单数量
-            # Thread_num:以新提交订单的数量作为并发数(这一次的TOTAL-上一次的TOTAL)
-            # TOTAL:总提交订单数量
-            # LATENCY:提交订单时间/处理订单笔数(只考虑该线程延迟，未考虑并发)
-            # P=OK:新创建付款订单数量
-            # Thread_num:以新提交付款订单的数量作为并发数(这一次的TOTAL-上一次的TOTAL)
-            # TOTAL:总付款提交订单数量
-            # LATENCY:提交付款订单时间/处理付款订单笔数(只考虑该线程延迟，未考虑并发)
+        with self.lock:
+            self.n_new_order = self.n_new_order + n_new_order
+            self.n_payment = self.n_payment + n_payment
+            self.n_new_order_ok = self.n_new_order_ok + n_new_order_ok
+            self.n_payment_ok = self.n_payment_ok + n_payment_ok
+            self.time_new_order = self.time_new_order + time_new_order
+            self.time_payment = self.time_payment + time_payment
+            # 这段时间内新提交的订单数和付款数
+            n_new_order_diff = self.n_new_order - self.n_new_order_past
+            n_payment_diff = self.n_payment - self.n_payment_past
+            # 旧值更新为新值，便于下一轮计算
+            self.n_new_order_past = self.n_new_order
+            self.n_payment_past = self.n_payment
+            self.n_new_order_ok_past = self.n_new_order_ok
+            self.n_payment_ok_past = self.n_payment_ok
+
+            elapsed = time.time() - self.stats.start
+            if self.n_new_order == 0 or elapsed <= 0:
+                return
+            # TPS_C(吞吐量):开始压测以来每秒成功创建的订单数
+            # NO/P=OK:成功的下单/付款数 DIFF:本次汇报新增的请求数 TOTAL:总请求数
+            # P50/P99:延迟分位数(秒)，平均值会掩盖长尾
             logging.info(
-                "TPS_C={}, NO=OK:{} Thread_num:{} TOTAL:{} LATENCY:{} , P=OK:{} Thread_num:{} TOTAL:{} LATENCY:{}".format(
-                    int(
-                        self.n_new_order_ok
-                        / (
-                            self.time_payment / n_payment_diff
-                            + self.time_new_order / n_new_order_diff
-                        )
-                    ),  # 吞吐量:完成订单数/((付款所用时间+订单所用时间)/并发数)
+                "TPS_C={}, NO=OK:{} DIFF:{} TOTAL:{} P50:{:.4f} P99:{:.4f} , P=OK:{} DIFF:{} TOTAL:{} P50:{:.4f} P99:{:.4f}".format(
+                    int(self.n_new_order_ok / elapsed),
                     self.n_new_order_ok,
                     n_new_order_diff,
                     self.n_new_order,
-                    self.time_new_order
-                    / self.n_new_order,  # 订单延迟:(创建订单所用时间/并发数)/新创建订单数
+                    self.stats.percentile("new_order", 50),
+                    self.stats.percentile("new_order", 99),
                     self.n_payment_ok,
                     n_payment_diff,
                     self.n_payment,
-                    self.time_payment / self.n_payment,  # 付款延迟:(付款所用时间/并发数)/付款订单数
+                    self.stats.percentile("payment", 50),
+                    self.stats.percentile("payment", 99),
+                )
+            )
+
+    # 压测结束，核对数据一致性并写出 JSON/CSV 报告；数据不一致时写完报告后抛出 ConsistencyError
+    def write_report(self, path: str = None, extra: dict = None) -> dict:
+        self.stats.finish()
+        if conf.Bench_Verify:
+            extra = dict(extra or {}, consistency=verify.verify(self))
+        queries = baseline.queries_per_operation(
+            self.statements_before, baseline.method_statements(self.clients.metrics())
+        )
+        report = self.stats.write_report(
+            path or conf.Bench_Report_File,
+            dict({
+                "uuid": self.uuid,
+                "mode": self.clients.name,
+                "server": self.server_info.get("server"),
+                "backend": self.server_info.get("backend"),
+                "profile": self.profile.name,
+                "load": self.load_stats,
+                "queries": queries,
+            }, **(extra or {})),
+        )
+        for op, result in report["operations"].items():
+            latency = result["latency"]
+            logging.info(
+                "{}: OK:{}/{} TPS:{:.1f} P50:{:.4f} P90:{:.4f} P99:{:.4f} P99.9:{:.4f} MAX:{:.4f} STATUS:{}".format(
+                    op, result["ok"], result["count"], result["throughput"],
+                    latency["p50"], latency["p90"], latency["p99"], latency["p99.9"], latency["max"],
+                    result["status"],
                 )
             )
-        self.lock.release()
-        # 旧值更新为新值，便于下一轮计算
-        self.n_new_order_past = self.n_new_order
-        self.n_payment_past = self.n_payment
-        self.n_new_order_ok_past = self.n_new_order_ok
-        self.n_payment_ok_past = self.n_payment_ok
+        consistency = report.get("consistency")
+        if consistency is not None and not consistency["ok"]:
+            raise verify.ConsistencyError("bench data inconsistent, failed checks: {}".format(
+                ", ".join(c["name"] for c in consistency["checks"] if not c["ok"])))
+        return report
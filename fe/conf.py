@@ -1,3 +1,5 @@
+import os
+
 URL = "http://127.0.0.1:5000/"
 Book_Num_Per_Store = 200
 Store_Num_Per_User = 2
@@ -5,7 +7,33 @@ Seller_Num = 2
 Buyer_Num = 10
 Session = 1
 Request_Per_Session = 1000
+Async_Virtual_Users = 1000
+Async_Request_Per_User = 5
+Async_Max_Connections = 200
+Open_Loop_Rate = 100
+Open_Loop_Ramp_To = None
+Open_Loop_Duration = 10
+Open_Loop_Latency_Threshold = 0.5
+Capacity_Rate_Step = 100
+Capacity_Max_Rate = 5000
 Default_Stock_Level = 1000000
 Default_User_Funds = 10000000
 Data_Batch_Size = 100
+Load_Workers = 8
 Use_Large_DB = True
+Load_Book_Pictures = False
+Workload_Profile = "default"
+Bench_Report_File = "bench_report.json"
+Bench_Comparison_File = "bench_comparison.json"
+Bench_Baseline_File = "bench_baseline.json"
+Bench_Diff_File = "bench_diff.json"
+Bench_Regression_Threshold = 0.4
+Bench_Latency_Tolerance = 0.005
+Bench_Gated_Metrics = ("throughput", "p50", "p90", "queries")
+# 环境变量 BE_BENCH_UPDATE_BASELINE=1 时记录基线，BE_BENCH_GATE=1 时 test_bench 与基线比较
+Bench_Update_Baseline = os.environ.get("BE_BENCH_UPDATE_BASELINE") == "1"
+Bench_Regression_Gate = os.environ.get("BE_BENCH_GATE") == "1"
+Bench_Verify = True
+Http_Pool_Connections = 10
+Http_Pool_Maxsize = 100
+Http_Pool_Block = False
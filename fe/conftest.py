@@ -1,3 +1,4 @@
+import os
 import requests
 import threading
 from urllib.parse import urljoin
@@ -8,9 +9,14 @@ thread: threading.Thread = None
 
 
 # 修改这里启动后端程序，如果不需要可删除这行代码
+# BE_SERVER=asgi 时测试异步模式的后端
 def run_backend():
     # rewrite this if rewrite backend
-    serve.be_run()
+    if os.environ.get("BE_SERVER") == "asgi":
+        from be import asgi
+        asgi.asgi_run()
+    else:
+        serve.be_run()
 
 
 def pytest_configure(config):
@@ -0,0 +1,55 @@
+import pytest
+
+from fe.access.new_seller import register_new_seller
+from fe.access import book
+from fe.access import auth
+import uuid
+from fe import conf
+
+
+class TestAddBooks:
+    @pytest.fixture(autouse=True)
+    def pre_run_initialization(self):
+        self.seller_id = "test_add_books_bulk_seller_id_{}".format(str(uuid.uuid1()))
+        self.store_id = "test_add_books_bulk_store_id_{}".format(str(uuid.uuid1()))
+        self.password = self.seller_id
+        self.seller = register_new_seller(self.seller_id, self.password)
+
+        code = self.seller.create_store(self.store_id)
+        assert code == 200
+        book_db = book.BookDB(conf.Use_Large_DB)
+        self.books = book_db.get_book_info(0, 100)
+        yield
+
+    def test_ok(self):
+        code = self.seller.add_books(self.store_id, [(10, b) for b in self.books])
+        assert code == 200
+
+        # 批量上架的书可以被检索到
+        a = auth.Auth(conf.URL)
+        for b in self.books[:3]:
+            code, books = a.search_books(b.title, "title", self.store_id)
+            assert code == 200
+            assert b.id in [bk["book_id"] for bk in books]
+
+    def test_error_exist_book_id(self):
+        code = self.seller.add_book(self.store_id, 0, self.books[0])
+        assert code == 200
+        code = self.seller.add_books(self.store_id, [(0, b) for b in self.books])
+        assert code != 200
+        # 整批失败，其余的书都没有上架
+        code = self.seller.add_books(self.store_id, [(0, b) for b in self.books[1:]])
+        assert code == 200
+
+    def test_error_repeat_book_id(self):
+        code = self.seller.add_books(self.store_id, [(0, self.books[0]), (0, self.books[0])])
+        assert code != 200
+
+    def test_error_non_exist_store_id(self):
+        code = self.seller.add_books(self.store_id + "x", [(0, b) for b in self.books])
+        assert code != 200
+
+    def test_error_non_exist_user_id(self):
+        self.seller.seller_id = self.seller.seller_id + "_x"
+        code = self.seller.add_books(self.store_id, [(0, b) for b in self.books])
+        assert code != 200
@@ -0,0 +1,6 @@
+from fe.bench.run import run_async_bench
+
+
+def test_async_bench():
+    report = run_async_bench()
+    assert report["operations"]["new_order"]["count"] > 0
@@ -1,9 +1,17 @@
-from fe.bench.run import run_bench
+import pytest
+from fe import conf
+from fe.bench.run import run_bench, run_regression_bench
 
 
 def test_bench():
-    try:
-        run_bench()
-    except Exception as e:
-        print("Exception in test_bench:", str(e))
-        assert 200 == 100,"test_bench过程出现异常"
+    report = run_bench()
+    assert report["operations"]["new_order"]["count"] > 0
+    assert report["consistency"]["ok"], report["consistency"]
+
+
+# 短时间压测的吞吐和延迟波动较大，与基线比较只在固定的测试机器上显式开启
+@pytest.mark.skipif(not conf.Bench_Regression_Gate, reason="set BE_BENCH_GATE=1 to compare with the bench baseline")
+def test_bench_regression():
+    diff = run_regression_bench()
+    if diff["baseline"] is None:
+        pytest.skip("no bench baseline, record one with BE_BENCH_UPDATE_BASELINE=1")
@@ -0,0 +1,71 @@
+from fe.bench import baseline
+from fe import conf
+
+
+class TestBenchBaseline:
+    def test_queries_per_operation(self):
+        before = baseline.method_statements(
+            'be_model_method_sql_statements_sum{method="Buyer.new_order"} 40\n'
+            'be_model_method_sql_statements_count{method="Buyer.new_order"} 10\n'
+        )
+        after = baseline.method_statements(
+            'be_model_method_sql_statements{method="Buyer.new_order",quantile="0.5"} 4\n'
+            'be_model_method_sql_statements_sum{method="Buyer.new_order"} 100\n'
+            'be_model_method_sql_statements_count{method="Buyer.new_order"} 22\n'
+            'be_model_method_sql_statements_sum{method="Buyer.payment"} 7\n'
+            'be_model_method_sql_statements_count{method="Buyer.payment"} 1\n'
+        )
+        assert baseline.queries_per_operation(before, after) == {"new_order": 5.0, "payment": 7.0}
+
+    def test_compare_within_threshold(self):
+        past = {"new_order": {"throughput": 100, "p50": 0.01, "p99": 0.02, "queries": 4}}
+        now = {"new_order": {"throughput": 90, "p50": 0.011, "p99": 0.021, "queries": 4}}
+        diff = baseline.compare(past, now, 0.2)
+        assert diff["regressions"] == []
+        assert diff["operations"]["new_order"]["throughput"]["change"] == -0.1
+
+    def test_compare_regression(self):
+        past = {"new_order": {"throughput": 100, "p50": 0.01, "p99": 0.02, "queries": 4}}
+        now = {"new_order": {"throughput": 50, "p50": 0.005, "p99": 0.02, "queries": 6}}
+        diff = baseline.compare(past, now, 0.2)
+        regressed = sorted(r["metric"] for r in diff["regressions"])
+        assert regressed == ["queries", "throughput"]
+
+    def test_compare_latency_tolerance(self):
+        past = {"payment": {"throughput": 100, "p99": 0.008}}
+        now = {"payment": {"throughput": 100, "p99": 0.012}}
+        assert baseline.compare(past, now, 0.2, 0.005)["regressions"] == []
+        assert len(baseline.compare(past, now, 0.2)["regressions"]) == 1
+
+    def test_compare_ungated_metric(self):
+        past = {"payment": {"throughput": 100, "p99": 0.008}}
+        now = {"payment": {"throughput": 100, "p99": 0.1}}
+        diff = baseline.compare(past, now, 0.2, gated=("throughput",))
+        assert diff["regressions"] == []
+        assert diff["operations"]["payment"]["p99"]["current"] == 0.1
+
+    def test_server_info(self):
+        text = (
+            "be_sql_statements_total 12\n"
+            'be_info{backend="sqlite",server="gunicorn"} 1\n'
+        )
+        assert baseline.server_info(text) == {"backend": "sqlite", "server": "gunicorn"}
+        assert baseline.server_info("be_sql_statements_total 12\n") == {}
+
+    def test_baseline_key_by_deployment(self):
+        report = {"mode": "http", "server": "werkzeug", "backend": "memory", "profile": "default"}
+        assert baseline.baseline_key(report) == "http/werkzeug/memory/default"
+        assert baseline.baseline_key(dict(report, backend="mysql")) != baseline.baseline_key(report)
+        assert baseline.baseline_key(dict(report, server="uvicorn")) != baseline.baseline_key(report)
+
+    def test_check_regression_without_baseline(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(conf, "Bench_Baseline_File", str(tmp_path / "baseline.json"))
+        monkeypatch.setattr(conf, "Bench_Update_Baseline", False)
+        report = {
+            "mode": "http", "server": "werkzeug", "backend": "memory", "profile": "default",
+            "operations": {"new_order": {"throughput": 1, "latency": {"p50": 1, "p90": 1, "p99": 1}}},
+        }
+        diff = baseline.check_regression(report)
+        assert diff["baseline"] is None
+        assert diff["regressions"] == []
+        assert not (tmp_path / "baseline.json").exists()
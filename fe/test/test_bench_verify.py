@@ -0,0 +1,67 @@
+import pytest
+from be.model import store
+from fe.bench.profile import Profile
+from fe.bench.session import Session
+from fe.bench.workload import Workload
+from fe.bench.local import ensure_database
+from fe.bench import verify
+
+
+class TestBenchVerify:
+    @pytest.fixture(autouse=True)
+    def run_workload(self):
+        ensure_database()
+        self.wl = Workload()
+        self.wl.profile = Profile("mixed")
+        self.wl.procedure_per_session = 200
+        self.wl.gen_database()
+        self.wl.begin()
+        Session(self.wl).run()
+        yield
+
+    def test_consistent(self):
+        result = verify.verify(self.wl)
+        assert result["ok"], result
+
+    def test_lost_stock(self):
+        session = store.get_db_conn()
+        session.query(store.Store).filter(
+            store.Store.store_id == self.wl.store_ids[0],
+            store.Store.book_id == self.wl.book_ids[0],
+        ).update({store.Store.stock_level: store.Store.stock_level - 1})
+        session.commit()
+        store.remove_db_conn()
+
+        result = verify.verify(self.wl)
+        assert not result["ok"]
+        assert [c["name"] for c in result["checks"] if not c["ok"]] == ["stock"]
+
+    def test_unmatched_debit(self):
+        buyer_id = self.wl.buyer_ids[0]
+        session = store.get_db_conn()
+        session.query(store.User).filter(store.User.user_id == buyer_id).update(
+            {store.User.balance: store.User.balance - 10})
+        session.commit()
+        store.remove_db_conn()
+
+        result = verify.verify(self.wl)
+        failed = [c["name"] for c in result["checks"] if not c["ok"]]
+        assert failed == ["money", "paid_orders"]
+        assert list(result["mismatched_balances"]) == [buyer_id]
+
+    def test_inconsistent_report(self):
+        session = store.get_db_conn()
+        session.query(store.User).filter(store.User.user_id == self.wl.buyer_ids[0]).update(
+            {store.User.balance: store.User.balance + 10})
+        session.commit()
+        store.remove_db_conn()
+
+        with pytest.raises(verify.ConsistencyError):
+            self.wl.write_report()
+
+
+# 校验连到的库里没有这次 workload 的数据时明确报错，而不是给出错误的结论
+def test_verify_unknown_workload():
+    ensure_database()
+    with pytest.raises(RuntimeError):
+        verify.verify(Workload())
@@ -28,6 +28,7 @@ class TestBuyerOrderCancel:
             non_exist_book_id=False, low_stock_level=False, max_book_count=5
         )
         self.buy_book_info_list = gen_book.buy_book_info_list
+        self.buy_book_id_list = buy_book_id_list
         assert ok
         b = register_new_buyer(self.buyer_id, self.password)
         self.buyer = b
@@ -58,3 +59,20 @@ class TestBuyerOrderCancel:
         code = self.buyer.buyer_order_cancel(self.buyer.user_id,self.order_id)
         assert code != 200
 
+    def test_cancel_paid_order(self):
+        code = self.buyer.add_funds(self.total_price)
+        assert code == 200
+        code = self.buyer.payment(self.order_id)
+        assert code == 200
+
+        code = self.buyer.buyer_order_cancel(self.buyer.user_id, self.order_id)
+        assert code == 200
+
+        code = self.buyer.payment(self.order_id)
+        assert code != 200
+
+        # 退款与库存都已恢复，不再充值也能重新下单并付款
+        code, order_id = self.buyer.new_order(self.store_id, self.buy_book_id_list)
+        assert code == 200
+        code = self.buyer.payment(order_id)
+        assert code == 200
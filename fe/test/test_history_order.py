@@ -31,6 +31,7 @@ class TestHistoryOrder:
             non_exist_book_id=False, low_stock_level=False, max_book_count=5
         )
         self.buy_book_info_list = gen_book.buy_book_info_list
+        self.buy_book_id_list = buy_book_id_list
         assert ok
         s = seller.Seller(conf.URL, self.seller_id, self.password)
         self.seller = s
@@ -50,9 +51,45 @@ class TestHistoryOrder:
 
 
     def test_ok(self):
-        code = self.buyer.history_order(self.buyer.user_id)
+        code, orders, next_cursor = self.buyer.history_order(self.buyer.user_id)
         assert code == 200
+        assert len(orders) == 1
+        assert orders[0]["order_id"] == self.order_id
+        assert orders[0]["total_price"] == self.total_price
+        assert len(orders[0]["books"]) == len(self.buy_book_id_list)
+        assert next_cursor == ""
+
+    def test_pagination(self):
+        order_ids = [self.order_id]
+        # 购买数量须为正数：先补货，再每单买一本
+        book_id = self.buy_book_id_list[0][0]
+        code = self.seller.add_stock_level(self.seller_id, self.store_id, book_id, 4)
+        assert code == 200
+        for i in range(4):
+            code, order_id = self.buyer.new_order(self.store_id, [(book_id, 1)])
+            assert code == 200
+            order_ids.append(order_id)
+
+        seen = []
+        cursor = None
+        while True:
+            code, orders, cursor = self.buyer.history_order(self.buyer.user_id, cursor, 2)
+            assert code == 200
+            assert len(orders) <= 2
+            seen.extend(order["order_id"] for order in orders)
+            if not cursor:
+                break
+        assert sorted(seen) == sorted(order_ids)
+
+    def test_invalid_cursor(self):
+        code, _, _ = self.buyer.history_order(self.buyer.user_id, "invalid_cursor")
+        assert code != 200
+
+    def test_invalid_page_size(self):
+        for page_size in ("5", 2.5, True):
+            code, _, _ = self.buyer.history_order(self.buyer.user_id, page_size=page_size)
+            assert code == 524
 
     def test_non_exist_user_id(self):
-        code = self.buyer.history_order(self.buyer.user_id+'_x')
+        code, _, _ = self.buyer.history_order(self.buyer.user_id+'_x')
         assert code != 200
\ No newline at end of file
@@ -0,0 +1,8 @@
+from fe.bench.run import run_comparison_bench
+
+
+def test_comparison_bench():
+    comparison = run_comparison_bench()
+    new_order = comparison["operations"]["new_order"]
+    assert new_order["local"]["p50"] > 0
+    assert new_order["http"]["p50"] > 0
@@ -0,0 +1,36 @@
+import pytest
+import uuid
+import requests
+from urllib.parse import urljoin
+
+from fe.access.new_buyer import register_new_buyer
+from fe import conf
+
+
+class TestMetrics:
+    @pytest.fixture(autouse=True)
+    def pre_run_initialization(self):
+        self.user_id = "test_metrics_{}".format(str(uuid.uuid1()))
+        self.password = self.user_id
+        self.buyer = register_new_buyer(self.user_id, self.password)
+        yield
+
+    def get_metrics(self) -> str:
+        r = requests.get(urljoin(conf.URL, "metrics"))
+        assert r.status_code == 200
+        return r.text
+
+    def test_route_metrics(self):
+        code = self.buyer.add_funds(10)
+        assert code == 200
+        text = self.get_metrics()
+        assert 'be_request_duration_seconds_count{route="/buyer/add_funds"}' in text
+        assert 'be_request_sql_statements{route="/buyer/add_funds",quantile="0.99"}' in text
+        assert "be_sql_statements_total" in text
+
+    def test_model_method_metrics(self):
+        code = self.buyer.add_funds(10)
+        assert code == 200
+        text = self.get_metrics()
+        assert 'be_model_method_duration_seconds_count{method="Buyer.add_funds"}' in text
+        assert 'be_model_method_sql_statements_count{method="User.register"}' in text
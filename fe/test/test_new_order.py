@@ -56,3 +56,44 @@ class TestNewOrder:
         assert ok
         code, _ = self.buyer.new_order(self.store_id + "_x", buy_book_id_list)
         assert code != 200
+
+    def test_low_stock_level_no_partial_decrement(self):
+        ok, buy_book_id_list = self.gen_book.gen(
+            non_exist_book_id=False, low_stock_level=True
+        )
+        assert ok
+        # 购买数量须为正数，库存为 0 的书不放进去
+        full_stock_list = [(book_id, count - 1) for book_id, count in buy_book_id_list if count > 1]
+        # 前面的书库存充足，最后一本库存不足
+        mixed_list = full_stock_list[:-1] + buy_book_id_list[-1:]
+        code, _ = self.buyer.new_order(self.store_id, mixed_list)
+        assert code != 200
+        # 下单失败不应扣减任何库存，全部库存仍然可以被买下
+        code, _ = self.buyer.new_order(self.store_id, full_stock_list)
+        assert code == 200
+
+    def test_repeat_book_id(self):
+        ok, buy_book_id_list = self.gen_book.gen(
+            non_exist_book_id=False, low_stock_level=False
+        )
+        assert ok
+        repeat_list = [(book_id, 1) for book_id, _ in buy_book_id_list]
+        code, _ = self.buyer.new_order(self.store_id, repeat_list + repeat_list)
+        assert code == 200
+
+    def test_invalid_count(self):
+        ok, buy_book_id_list = self.gen_book.gen(
+            non_exist_book_id=False, low_stock_level=True
+        )
+        assert ok
+        book_id, _ = buy_book_id_list[0]
+        for count in (0, -5, "1", 1.5, True):
+            code, _ = self.buyer.new_order(self.store_id, [(book_id, count)])
+            assert code == 524
+        # 负数数量不应增加库存：库存之外多买一本仍然失败，恰好买光库存成功
+        # 购买数量须为正数，库存为 0 的书不放进去
+        full_stock_list = [(book_id, count - 1) for book_id, count in buy_book_id_list if count > 1]
+        code, _ = self.buyer.new_order(self.store_id, buy_book_id_list)
+        assert code != 200
+        code, _ = self.buyer.new_order(self.store_id, full_stock_list)
+        assert code == 200
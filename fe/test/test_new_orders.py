@@ -0,0 +1,99 @@
+import pytest
+
+from fe.test.gen_book_data import GenBook
+from fe.access.new_buyer import register_new_buyer
+import uuid
+
+
+class TestNewOrders:
+    @pytest.fixture(autouse=True)
+    def pre_run_initialization(self):
+        self.seller_id = "test_new_orders_seller_id_{}".format(str(uuid.uuid1()))
+        self.store_id_1 = "test_new_orders_store_id_{}".format(str(uuid.uuid1()))
+        self.store_id_2 = "test_new_orders_store_id_{}".format(str(uuid.uuid1()))
+        self.buyer_id = "test_new_orders_buyer_id_{}".format(str(uuid.uuid1()))
+        self.password = self.seller_id
+        self.buyer = register_new_buyer(self.buyer_id, self.password)
+        self.gen_book_1 = GenBook(self.seller_id, self.store_id_1)
+        self.gen_book_2 = GenBook(self.seller_id + "_2", self.store_id_2)
+        yield
+
+    def test_ok(self):
+        ok, buy_book_id_list_1 = self.gen_book_1.gen(
+            non_exist_book_id=False, low_stock_level=False
+        )
+        assert ok
+        ok, buy_book_id_list_2 = self.gen_book_2.gen(
+            non_exist_book_id=False, low_stock_level=False
+        )
+        assert ok
+        code, results = self.buyer.new_orders(
+            [(self.store_id_1, buy_book_id_list_1), (self.store_id_2, buy_book_id_list_2)]
+        )
+        assert code == 200
+        assert len(results) == 2
+        for result in results:
+            assert result["code"] == 200
+            assert result["order_id"] != ""
+        assert results[0]["order_id"] != results[1]["order_id"]
+
+    def test_partial_fail(self):
+        ok, buy_book_id_list_1 = self.gen_book_1.gen(
+            non_exist_book_id=False, low_stock_level=False
+        )
+        assert ok
+        ok, buy_book_id_list_2 = self.gen_book_2.gen(
+            non_exist_book_id=False, low_stock_level=True
+        )
+        assert ok
+        code, results = self.buyer.new_orders(
+            [
+                (self.store_id_1, buy_book_id_list_1),
+                (self.store_id_2, buy_book_id_list_2),
+                (self.store_id_1 + "_x", buy_book_id_list_1),
+            ]
+        )
+        assert code == 200
+        assert results[0]["code"] == 200
+        assert results[1]["code"] != 200
+        assert results[1]["order_id"] == ""
+        assert results[2]["code"] != 200
+
+    def test_shared_stock(self):
+        ok, buy_book_id_list = self.gen_book_1.gen(
+            non_exist_book_id=False, low_stock_level=True
+        )
+        assert ok
+        # 同一批次中的订单共享库存：第一单买光库存后第二单应当失败
+        # 购买数量须为正数，库存为 0 的书不放进去
+        full_stock_list = [(book_id, count - 1) for book_id, count in buy_book_id_list if count > 1]
+        one_more_list = [(book_id, 1) for book_id, _ in buy_book_id_list]
+        code, results = self.buyer.new_orders(
+            [(self.store_id_1, full_stock_list), (self.store_id_1, one_more_list)]
+        )
+        assert code == 200
+        assert results[0]["code"] == 200
+        assert results[1]["code"] != 200
+
+    def test_invalid_count(self):
+        ok, buy_book_id_list = self.gen_book_1.gen(
+            non_exist_book_id=False, low_stock_level=False
+        )
+        assert ok
+        negative_list = [(book_id, -count) for book_id, count in buy_book_id_list]
+        code, results = self.buyer.new_orders(
+            [(self.store_id_1, negative_list), (self.store_id_1, buy_book_id_list)]
+        )
+        assert code == 200
+        assert results[0]["code"] == 524
+        assert results[0]["order_id"] == ""
+        assert results[1]["code"] == 200
+
+    def test_non_exist_user_id(self):
+        ok, buy_book_id_list = self.gen_book_1.gen(
+            non_exist_book_id=False, low_stock_level=False
+        )
+        assert ok
+        self.buyer.user_id = self.buyer.user_id + "_x"
+        code, _ = self.buyer.new_orders([(self.store_id_1, buy_book_id_list)])
+        assert code != 200
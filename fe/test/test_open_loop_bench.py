@@ -0,0 +1,20 @@
+from fe.bench import baseline
+from fe.bench.open_loop import find_capacity
+from fe.bench.run import run_open_loop_bench
+from fe.bench.workload import Workload, HttpClients
+
+
+def test_open_loop_bench():
+    report = run_open_loop_bench(rate=20, duration=2, ramp_to=40)
+    assert report["operations"]["new_order"]["count"] > 0
+
+
+# 容量搜索只在开始前登录一次，各级的请求中不应有登录
+def test_capacity_search_logs_in_once():
+    wl = Workload()
+    wl.gen_database()
+    before = baseline.method_statements(HttpClients.metrics()).get("User.login", (0, 0))[1]
+    capacity = find_capacity(wl, 10, 10, 20, 1, 10)
+    after = baseline.method_statements(HttpClients.metrics()).get("User.login", (0, 0))[1]
+    assert len(capacity["steps"]) == 2
+    assert after - before == wl.buyer_num
@@ -6,6 +6,8 @@ from fe.access.buyer import Buyer
 from fe.test.gen_book_data import GenBook
 from fe.access.new_buyer import register_new_buyer
 from fe.access.book import Book
+from be.model import buyer
+from be.model import store
 import uuid
 
 
@@ -51,4 +53,70 @@ class TestOvertimeOrderCancel:
 
     def test_ok(self):
         code = self.buyer.overtime_order_cancel()
-        assert code == 200
\ No newline at end of file
+        assert code == 200
+
+    def test_unexpired_order_kept(self):
+        code = self.buyer.overtime_order_cancel()
+        assert code == 200
+        # 刚创建的订单未超时，仍然可以付款
+        code = self.buyer.add_funds(self.total_price)
+        assert code == 200
+        code = self.buyer.payment(self.order_id)
+        assert code == 200
+
+
+class TestCancelExpiredOrders:
+    @pytest.fixture(autouse=True)
+    def pre_run_initialization(self):
+        self.buyer_id = "test_cancel_expired_orders_buyer_id_{}".format(str(uuid.uuid1()))
+        self.password = self.buyer_id
+        self.buyer = register_new_buyer(self.buyer_id, self.password)
+        self.orders = []
+        for i in range(3):
+            seller_id = "test_cancel_expired_orders_seller_id_{}_{}".format(i, str(uuid.uuid1()))
+            store_id = "test_cancel_expired_orders_store_id_{}_{}".format(i, str(uuid.uuid1()))
+            gen_book = GenBook(seller_id, store_id)
+            ok, buy_book_id_list = gen_book.gen(
+                non_exist_book_id=False, low_stock_level=False, max_book_count=5
+            )
+            assert ok
+            stock = self.stock_levels(store_id)
+            code, order_id = self.buyer.new_order(store_id, buy_book_id_list)
+            assert code == 200
+            self.orders.append((store_id, order_id, stock))
+        yield
+
+    @staticmethod
+    def stock_levels(store_id: str) -> dict:
+        session = store.get_db_conn()
+        try:
+            return dict(
+                session.query(store.Store.book_id, store.Store.stock_level).filter(store.Store.store_id == store_id)
+            )
+        finally:
+            store.remove_db_conn()
+
+    @staticmethod
+    def order_status(order_id: str) -> int:
+        session = store.get_db_conn()
+        try:
+            return session.query(store.Orders.status).filter(store.Orders.order_id == order_id).scalar()
+        finally:
+            store.remove_db_conn()
+
+    def test_expired_orders_cancelled(self):
+        # 超时设为 0，所有未付款订单都已超时；每批 2 个，分多批取消
+        b = buyer.Buyer()
+        try:
+            while b.cancel_expired_orders(timeout=0, batch_size=2) == 2:
+                pass
+        finally:
+            store.remove_db_conn()
+
+        code = self.buyer.add_funds(100000000)
+        assert code == 200
+        for store_id, order_id, stock in self.orders:
+            assert self.order_status(order_id) == 3
+            assert self.stock_levels(store_id) == stock
+            code = self.buyer.payment(order_id)
+            assert code != 200
@@ -1,3 +1,4 @@
+import copy
 import pytest
 from fe.access.new_seller import register_new_seller
 from fe.access import book
@@ -30,46 +31,67 @@ class TestSearchBooks:
         # 测试根据书籍标题搜索，预期应该能找到
         for b in self.books:
             book_title = b.title
-            code = self.user.search_books(book_title, "title", self.store_id)
+            code, books = self.user.search_books(book_title, "title", self.store_id)
             assert code == 200
+            assert b.id in [book["book_id"] for book in books]
 
     def test_search_books_by_tag(self):
         # 测试根据书籍标签搜索，预期应该能找到
         for b in self.books:
             book_tags = b.tags
-            code = self.user.search_books(book_tags[0], "tag",self.store_id)
+            code, books = self.user.search_books(book_tags[0], "tag",self.store_id)
             assert code == 200
+            assert b.id in [book["book_id"] for book in books]
 
     def test_search_books_by_content(self):
         # 测试根据书籍目录搜索，预期应该能找到
         for b in self.books:
             book_content = b.content
-            code = self.user.search_books(book_content[0:10], "content",self.store_id)
+            code, _ = self.user.search_books(book_content[0:10], "content",self.store_id)
             assert code == 200
 
     def test_search_books_by_book_intro(self):
         # 测试根据书籍内容搜索，预期应该能找到
         for b in self.books:
             book_intro = b.book_intro
-            code = self.user.search_books(book_intro[0:10], "book_intro",self.store_id)
+            code, _ = self.user.search_books(book_intro[0:10], "book_intro",self.store_id)
             assert code == 200
 
     def test_search_books_invalid_scope(self):
         # 测试使用无效的搜索范围，预期应该返回错误
         for b in self.books:
             book_title = b.title
-            code = self.user.search_books(book_title, "invalid_scope",self.store_id)
+            code, _ = self.user.search_books(book_title, "invalid_scope",self.store_id)
             assert code != 200
 
     def test_search_books_no_result(self):
         # 测试一个不存在的查询，预期应该返回一个空的结果
         non_exist_query = "non_existing_book_title"
-        code = self.user.search_books(non_exist_query, "title",self.store_id)
+        code, books = self.user.search_books(non_exist_query, "title",self.store_id)
         assert code == 200
+        assert books == []
+
+    def test_search_books_invalid_page(self):
+        # 测试页码不是整数，预期应该返回参数错误而不是服务器异常
+        for page in ("2", 1.5, True):
+            code, _ = self.user.search_books(self.books[0].title, "title", self.store_id, page)
+            assert code == 524
 
     def test_search_books_invalid_store_id(self):
         # 测试使用不存在的店铺 ID 进行搜索，预期应该返回错误
         non_exist_store_id = "non_existing_store_id"
-        code = self.user.search_books("query", "title", non_exist_store_id)
+        code, _ = self.user.search_books("query", "title", non_exist_store_id)
         assert code != 200
 
+
+    def test_search_books_distinct_width_and_accent(self):
+        # 简介中同时出现全角与半角、带重音与不带重音的词，上架不应因检索词冲突失败
+        bk = copy.copy(self.books[0])
+        bk.id = "{}_{}".format(bk.id, str(uuid.uuid1()))
+        bk.book_intro = "sql ｓｑｌ cafe café"
+        code = self.seller.add_book(self.store_id, 0, bk)
+        assert code == 200
+        for query in ("ｓｑｌ", "café"):
+            code, books = self.user.search_books(query, "book_intro", self.store_id)
+            assert code == 200
+            assert bk.id in [book["book_id"] for book in books]
@@ -0,0 +1,106 @@
+import copy
+import pytest
+import threading
+import uuid
+
+from fe import conf
+from fe.access import auth
+from fe.access import book
+from fe.access.new_buyer import register_new_buyer
+from fe.access.new_seller import register_new_seller
+
+
+class TestStorePrice:
+    @pytest.fixture(autouse=True)
+    def pre_run_initialization(self):
+        # 两个商铺上架同一本书，定价不同
+        self.stores = []
+        for i in range(2):
+            seller_id = "test_store_price_seller_{}_{}".format(i, str(uuid.uuid1()))
+            store_id = "test_store_price_store_{}_{}".format(i, str(uuid.uuid1()))
+            seller = register_new_seller(seller_id, seller_id)
+            code = seller.create_store(store_id)
+            assert code == 200
+            self.stores.append((seller, store_id))
+        book_db = book.BookDB(conf.Use_Large_DB)
+        self.book = book_db.get_book_info(0, 1)[0]
+        self.prices = [10, 999]
+        self.buyer_id = "test_store_price_buyer_{}".format(str(uuid.uuid1()))
+        self.buyer = register_new_buyer(self.buyer_id, self.buyer_id)
+        self.auth = auth.Auth(conf.URL)
+        yield
+
+    def add_books(self):
+        for (seller, store_id), price in zip(self.stores, self.prices):
+            bk = copy.copy(self.book)
+            bk.price = price
+            code = seller.add_book(store_id, 10, bk)
+            assert code == 200
+
+    def test_order_uses_store_price(self):
+        self.add_books()
+        for (_, store_id), price in zip(self.stores, self.prices):
+            code, order_id = self.buyer.new_order(store_id, [(self.book.id, 2)])
+            assert code == 200
+            code, orders, _ = self.buyer.history_order(self.buyer_id)
+            assert code == 200
+            order = [o for o in orders if o["order_id"] == order_id][0]
+            assert order["total_price"] == price * 2
+
+    def test_search_returns_store_price(self):
+        self.add_books()
+        for (_, store_id), price in zip(self.stores, self.prices):
+            code, books = self.auth.search_books(self.book.title, "title", store_id)
+            assert code == 200
+            assert [(b["book_id"], b["book_info"]["price"]) for b in books] == [(self.book.id, price)]
+
+    def test_add_books_store_price(self):
+        for (seller, store_id), price in zip(self.stores, self.prices):
+            bk = copy.copy(self.book)
+            bk.price = price
+            code = seller.add_books(store_id, [(10, bk)])
+            assert code == 200
+        code, books = self.auth.search_books(self.book.title, "title", self.stores[1][1])
+        assert code == 200
+        assert [b["book_info"]["price"] for b in books] == [999]
+
+    def test_conflicting_book_info(self):
+        self.add_books()
+        seller, store_id = self.stores[0]
+        other_store_id = store_id + "_other"
+        code = seller.create_store(other_store_id)
+        assert code == 200
+        bk = copy.copy(self.book)
+        bk.title = bk.title + "_x"
+        code = seller.add_book(other_store_id, 10, bk)
+        assert code == 523
+        code = seller.add_books(other_store_id, [(10, bk)])
+        assert code == 523
+
+    # 两个商铺同时上架同一批目录中还没有的书：后提交的一方插入目录时主键冲突，重试后应当成功
+    def test_concurrent_new_books(self):
+        book_db = book.BookDB(conf.Use_Large_DB)
+        books = []
+        for bk in book_db.get_book_info(0, 20):
+            bk = copy.copy(bk)
+            bk.id = "{}_{}".format(bk.id, str(uuid.uuid1()))
+            books.append(bk)
+
+        barrier = threading.Barrier(len(self.stores))
+        codes = [None] * len(self.stores)
+
+        def add_books(i):
+            seller, store_id = self.stores[i]
+            barrier.wait()
+            codes[i] = seller.add_books(store_id, [(10, bk) for bk in books])
+
+        threads = [threading.Thread(target=add_books, args=(i,)) for i in range(len(self.stores))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert codes == [200] * len(self.stores)
+
+        for _, store_id in self.stores:
+            code, _ = self.buyer.new_order(store_id, [(bk.id, 1) for bk in books])
+            assert code == 200
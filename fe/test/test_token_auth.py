@@ -0,0 +1,113 @@
+import multiprocessing
+import time
+import pytest
+import uuid
+
+from fe.access import auth
+from fe.access.new_buyer import register_new_buyer
+from fe import conf
+from be.model.token_cache import TokenCache
+
+
+class TestTokenAuth:
+    @pytest.fixture(autouse=True)
+    def pre_run_initialization(self):
+        self.user_id = "test_token_auth_{}".format(str(uuid.uuid1()))
+        self.password = self.user_id
+        self.buyer = register_new_buyer(self.user_id, self.password)
+        self.auth = auth.Auth(conf.URL)
+        yield
+
+    def test_ok(self):
+        code = self.buyer.add_funds(10)
+        assert code == 200
+        # 第二次请求命中 token 缓存
+        code = self.buyer.add_funds(10)
+        assert code == 200
+
+    def test_invalid_token(self):
+        self.buyer.token = self.buyer.token + "_x"
+        code = self.buyer.add_funds(10)
+        assert code == 401
+
+    def test_missing_token(self):
+        self.buyer.token = ""
+        code = self.buyer.add_funds(10)
+        assert code == 401
+
+    def test_logout_revokes_token(self):
+        code = self.buyer.add_funds(10)
+        assert code == 200
+        code = self.auth.logout(self.user_id, self.buyer.token)
+        assert code == 200
+        code = self.buyer.add_funds(10)
+        assert code == 401
+
+    def test_logout_revokes_token_for_every_request(self):
+        # 多进程部署时每个请求可能落到不同的进程，吊销后的每一个请求都要被拒绝
+        for _ in range(5):
+            code = self.buyer.add_funds(10)
+            assert code == 200
+        code = self.auth.logout(self.user_id, self.buyer.token)
+        assert code == 200
+        for _ in range(20):
+            code = self.buyer.add_funds(10)
+            assert code == 401
+
+    def test_login_revokes_old_token(self):
+        code = self.buyer.add_funds(10)
+        assert code == 200
+        code, new_token = self.auth.login(self.user_id, self.password, "other terminal")
+        assert code == 200
+        code = self.buyer.add_funds(10)
+        assert code == 401
+        self.buyer.token = new_token
+        code = self.buyer.add_funds(10)
+        assert code == 200
+
+    def test_change_password_revokes_token(self):
+        code = self.buyer.add_funds(10)
+        assert code == 200
+        code = self.auth.password(self.user_id, self.password, self.password + "_new")
+        assert code == 200
+        code = self.buyer.add_funds(10)
+        assert code == 401
+
+    def test_unregister_revokes_token(self):
+        code = self.buyer.add_funds(10)
+        assert code == 200
+        code = self.auth.unregister(self.user_id, self.password)
+        assert code == 200
+        code = self.buyer.add_funds(10)
+        assert code == 401
+
+    def test_rejected_request_keeps_connection_usable(self):
+        # 长连接上被拒绝的请求不读请求体，之后同一连接上的请求仍要正常处理
+        token = self.buyer.token
+        self.buyer.token = ""
+        for _ in range(3):
+            code = self.buyer.add_funds(10)
+            assert code == 401
+            self.buyer.token = token
+            code = self.buyer.add_funds(10)
+            assert code == 200
+            self.buyer.token = ""
+
+
+# 两个缓存共用一个失效计数，相当于两个工作进程：一个进程吊销后，另一个进程缓存的 token 也失效
+def test_token_cache_shared_revocation():
+    generation = multiprocessing.Value("q", 0)
+    caches = [TokenCache(), TokenCache()]
+    for cache in caches:
+        cache.share(generation)
+    expire_at = time.time() + 60
+    for cache in caches:
+        cache.put("token", "user", expire_at, cache.current_version())
+        assert cache.get("token") == "user"
+
+    version = caches[1].current_version()
+    caches[0].invalidate_user("user")
+    assert caches[1].get("token") is None
+    # 吊销前开始的校验不能把旧 token 写回缓存
+    caches[1].put("token", "user", expire_at, version)
+    assert caches[1].get("token") is None